@@ -1,15 +1,35 @@
 from fastapi import FastAPI, Request, HTTPException, Depends, status
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
 import sqlite3
 import hashlib
 import hmac
 import os
-from datetime import datetime, timedelta
-from typing import Optional
+import sys
+import json
+import socket
+import asyncio
+import queue
+import base64
+import cProfile
+import pstats
+import inspect
+import ipaddress
+import contextvars
+import functools
+import itertools
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Union
+from urllib.parse import urlparse
+import numpy as np
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -27,6 +47,12 @@ SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER", "")  # Your Gmail address
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")  # Your Gmail app password
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(DB_PATH), "profiles"))
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Profile 1-in-N requests (0 = off)
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # Seconds between stack samples
+PROFILE_FLUSH_INTERVAL = float(os.getenv("PROFILE_FLUSH_INTERVAL", "10"))  # Seconds between sampled.folded rewrites
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", "10000"))  # Distinct sampled stacks kept in memory
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))  # Per-request .prof files kept; oldest are deleted
 
 # Auto-detect Ollama models
 def get_available_models():
@@ -45,6 +71,57 @@ def get_available_models():
 AVAILABLE_MODELS = get_available_models()
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", AVAILABLE_MODELS[0] if AVAILABLE_MODELS else "llama3.2:3b")
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434/v1/responses")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", OLLAMA_URL.split("/v1/")[0].split("/api/")[0])
+_prewarm = os.getenv("PREWARM_MODELS", OLLAMA_MODEL)  # Comma-separated, or "*" for every discovered model
+PREWARM_MODELS = AVAILABLE_MODELS if _prewarm.strip() == "*" else [m.strip() for m in _prewarm.split(",") if m.strip()]
+KEEP_ALIVE_MIN = int(os.getenv("KEEP_ALIVE_MIN", "300"))  # Seconds
+KEEP_ALIVE_MAX = int(os.getenv("KEEP_ALIVE_MAX", "3600"))  # Seconds (outside business hours)
+BUSINESS_HOURS = os.getenv("BUSINESS_HOURS", "8-18")  # Local hours when used models stay resident ("" = off)
+BUSINESS_HOURS_MIN_RATE = float(os.getenv("BUSINESS_HOURS_MIN_RATE", "6"))  # Requests in the last hour before a model stays until closing
+
+def _parse_business_hours(value: str) -> Optional[tuple]:
+    """Parse "START-END" (whole local hours, 0-24) into (start, end); "" turns the feature off."""
+    if not value.strip():
+        return None
+    try:
+        start, end = (int(part) for part in value.split("-"))
+    except ValueError:
+        raise RuntimeError(f"BUSINESS_HOURS must look like 8-18 (whole hours), got {value!r}.")
+    if not 0 <= start < end <= 24:
+        raise RuntimeError(f"BUSINESS_HOURS must satisfy 0 <= start < end <= 24, got {value!r}.")
+    return start, end
+
+_business_hours = _parse_business_hours(BUSINESS_HOURS)
+MODEL_POLL_INTERVAL = int(os.getenv("MODEL_POLL_INTERVAL", "60"))  # Seconds between /api/ps checks
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))  # Conversations kept before LRU eviction
+SIGNED_KEYS = os.getenv("SIGNED_KEYS", "false").lower() in ("1", "true", "yes")  # Issue self-verifying keys
+if SIGNED_KEYS and SECRET_KEY == "dev-secret-key":
+    # Anyone could mint valid signed keys with the published default secret
+    raise RuntimeError("SIGNED_KEYS=true requires SECRET_KEY to be set to a private value.")
+REVOCATION_REFRESH = int(os.getenv("REVOCATION_REFRESH", "30"))  # Seconds between revocation reloads from the DB
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "6000"))  # Characters per map chunk
+SUMMARY_CHUNK_OVERLAP = int(os.getenv("SUMMARY_CHUNK_OVERLAP", "400"))  # Characters shared by neighbouring chunks
+SUMMARY_FANOUT = int(os.getenv("SUMMARY_FANOUT", "4"))  # Concurrent Ollama calls per /summarize request
+if not 0 <= SUMMARY_CHUNK_OVERLAP < SUMMARY_CHUNK_CHARS // 2:
+    # Otherwise each chunk starts barely after the previous one: thousands of near-identical calls
+    raise RuntimeError("SUMMARY_CHUNK_OVERLAP must be at least 0 and less than half of SUMMARY_CHUNK_CHARS.")
+EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-embed-text")
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "10"))  # How long /embed waits to merge concurrent requests
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))  # Inputs per merged /api/embed call
+EMBED_MAX_INPUTS = int(os.getenv("EMBED_MAX_INPUTS", "2048"))  # Inputs accepted by one /embed request
+TICKET_INDEX_PATH = os.getenv("TICKET_INDEX_PATH", os.path.join(os.path.dirname(DB_PATH), "tickets.f32"))
+TICKET_EMBED_BATCH = int(os.getenv("TICKET_EMBED_BATCH", "64"))  # Tickets per /api/embed call when ingesting
+TICKET_EMBED_WORKERS = int(os.getenv("TICKET_EMBED_WORKERS", "2"))  # Embedding batches in flight while ingesting
+TICKET_TOP_K = int(os.getenv("TICKET_TOP_K", "3"))  # Similar tickets injected into the prompt
+TICKET_MAX_TOP_K = int(os.getenv("TICKET_MAX_TOP_K", "20"))  # Upper bound on a caller's top_k
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Background workers processing /jobs
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "86400"))  # Seconds finished job results are kept
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "60"))  # Longest long-poll a client may request
+JOB_WEBHOOK_ALLOW_PRIVATE = os.getenv("JOB_WEBHOOK_ALLOW_PRIVATE", "false").lower() in ("1", "true", "yes")  # Allow webhooks to loopback/private hosts
+JOB_WORKER_MAX_BACKOFF = float(os.getenv("JOB_WORKER_MAX_BACKOFF", "30"))  # Longest pause after a job worker error
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "3600"))  # Seconds an Idempotency-Key result is replayed
+IDEMPOTENCY_MAX = int(os.getenv("IDEMPOTENCY_MAX", "10000"))  # Idempotency entries kept before oldest are dropped
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "60"))  # Seconds to let in-flight generations finish when draining
 print(f"[INFO] Using Ollama model: {OLLAMA_MODEL}")
 print(f"[INFO] Available models: {AVAILABLE_MODELS}")
 
@@ -57,6 +134,7 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Ensure data dir exists
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 os.makedirs("static", exist_ok=True)
+os.makedirs(PROFILE_DIR, exist_ok=True)
 
 # --- Email helper ---
 def send_email(subject: str, body: str, to_email: str = ADMIN_EMAIL):
@@ -98,16 +176,1339 @@ def create_schema():
         expires_at TEXT,
         revoked INTEGER DEFAULT 0
     )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        key_hash TEXT NOT NULL,
+        prompt TEXT NOT NULL,
+        webhook_url TEXT,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        finished_at REAL,
+        expires_at REAL
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+    c.execute('''CREATE TABLE IF NOT EXISTS tickets (
+        row INTEGER PRIMARY KEY,
+        ticket TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )''')
     conn.commit()
     conn.close()
 
 create_schema()
 
+# --- Profiling ---
+# `ProfilingMiddleware` attaches a profiler to the request context for the whole
+# request, response serialization and body included. cProfile and the stack
+# sampler only see the threads they are told about, so the middleware covers the
+# event loop thread and `ProfiledRoute` wraps every sync endpoint and dependency
+# (which FastAPI runs in a threadpool) to cover the worker threads.
+_active_profiler = contextvars.ContextVar("active_profiler", default=None)
+_request_counter = itertools.count()
+_sampled_stacks = Counter()
+_sampled_threads = Counter()  # thread id -> number of sampled requests using it
+_sampler_lock = threading.Lock()
+_sampler_thread = None
+_loop_profiled = False  # Only one request at a time can own the event loop thread's cProfile hook
+
+class RequestProfiler:
+    """Deterministic cProfile run for a single admin-requested request.
+
+    Each thread that works on the request gets its own cProfile.Profile; they
+    are merged into one .prof file when saved. The event loop thread's profile
+    also sees other requests interleaved with this one.
+    """
+    def __init__(self):
+        self.profiles = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def enter(self):
+        depth = getattr(self.local, "depth", 0)
+        self.local.depth = depth + 1
+        if depth == 0:
+            self.local.profile = cProfile.Profile()
+            with self.lock:
+                self.profiles.append(self.local.profile)
+            self.local.profile.enable()
+
+    def exit(self):
+        self.local.depth -= 1
+        if self.local.depth == 0:
+            self.local.profile.disable()
+
+    def save(self, name: str):
+        with self.lock:
+            profiles = list(self.profiles)
+        if profiles:
+            pstats.Stats(*profiles).dump_stats(os.path.join(PROFILE_DIR, name))
+            _prune_profiles()
+
+def _prune_profiles():
+    """Delete the oldest per-request profiles past PROFILE_MAX_FILES (names start with a timestamp)."""
+    names = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".prof"))
+    for name in names[:max(0, len(names) - PROFILE_MAX_FILES)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass  # Pruned concurrently by another save
+
+class SampledProfiler:
+    """Registers the current thread with the background stack sampler."""
+    def enter(self):
+        _start_sampler()
+        with _sampler_lock:
+            _sampled_threads[threading.get_ident()] += 1
+
+    def exit(self):
+        tid = threading.get_ident()
+        with _sampler_lock:
+            _sampled_threads[tid] -= 1
+            if _sampled_threads[tid] <= 0:
+                del _sampled_threads[tid]
+
+def _fold_stack(frame) -> str:
+    """Render a frame chain root-first in collapsed-stack (flamegraph) format."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def _sampler_loop():
+    last_flush, dirty = time.time(), False
+    while True:
+        time.sleep(PROFILE_SAMPLE_INTERVAL)
+        with _sampler_lock:
+            if _sampled_threads:
+                frames = sys._current_frames()
+                for tid in _sampled_threads:
+                    frame = frames.get(tid)
+                    if frame is None:
+                        continue
+                    stack = _fold_stack(frame)
+                    # Bound memory: new stacks past PROFILE_MAX_STACKS are lumped together
+                    if stack not in _sampled_stacks and len(_sampled_stacks) >= PROFILE_MAX_STACKS:
+                        stack = "(other stacks)"
+                    _sampled_stacks[stack] += 1
+                    dirty = True
+        if dirty and time.time() - last_flush >= PROFILE_FLUSH_INTERVAL:
+            _flush_sampled_stacks()
+            last_flush, dirty = time.time(), False
+
+def _start_sampler():
+    global _sampler_thread
+    with _sampler_lock:
+        if _sampler_thread is None:
+            _sampler_thread = threading.Thread(target=_sampler_loop, name="profile-sampler", daemon=True)
+            _sampler_thread.start()
+
+def _flush_sampled_stacks():
+    """Write the aggregated samples to `sampled.folded` (input for flamegraph.pl / speedscope)."""
+    with _sampler_lock:
+        lines = [f"{stack} {count}\n" for stack, count in _sampled_stacks.most_common()]
+    path = os.path.join(PROFILE_DIR, "sampled.folded")
+    with open(path + ".tmp", "w") as f:
+        f.writelines(lines)
+    os.replace(path + ".tmp", path)
+
+def profiled(func):
+    """Run sync `func` under the request's profiler, if one is active."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _active_profiler.get()
+        if profiler is None:
+            return func(*args, **kwargs)
+        profiler.enter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.exit()
+    wrapper.profiled = True
+    return wrapper
+
+def profiled_iter(iterable):
+    """Yield from `iterable`, profiling each step (sync streaming bodies run in the threadpool)."""
+    step = profiled(iter(iterable).__next__)
+    while True:
+        try:
+            yield step()
+        except StopIteration:
+            return
+
+def _profile_dependant(dependant):
+    for sub in dependant.dependencies:
+        _profile_dependant(sub)
+    call = dependant.call
+    # Async callables run on the event loop thread, which the middleware already profiles
+    if inspect.isfunction(call) and not inspect.iscoroutinefunction(call) and not inspect.isgeneratorfunction(call) \
+            and not getattr(call, "profiled", False):
+        dependant.call = profiled(call)
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that runs every sync endpoint and dependency under the request's profiler."""
+    def get_route_handler(self):
+        _profile_dependant(self.dependant)
+        return super().get_route_handler()
+
+app.router.route_class = ProfiledRoute
+
+def _is_admin_request(request: Request) -> bool:
+    """Check HTTP Basic admin credentials without raising (used by middleware)."""
+    auth = request.headers.get("authorization", "")
+    if not auth.lower().startswith("basic "):
+        return False
+    try:
+        username, _, password = base64.b64decode(auth[6:]).decode().partition(":")
+    except Exception:
+        return False
+    return hmac.compare_digest(username, ADMIN_USER) and hmac.compare_digest(password, ADMIN_PASS)
+
+class ProfilingMiddleware:
+    """Profile admin requests sent with `x-profile: 1` / `?profile=1`, and 1-in-N sampled requests.
+
+    Profiling lasts until the last body chunk is sent, so response
+    serialization and streamed bodies are included.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _loop_profiled
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        wants_profile = request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+        name = None
+        if wants_profile and _is_admin_request(request):
+            profiler = RequestProfiler()
+            name = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}_{request.url.path.strip('/').replace('/', '_') or 'root'}.prof"
+        elif PROFILE_SAMPLE_RATE > 0 and next(_request_counter) % PROFILE_SAMPLE_RATE == 0:
+            profiler = SampledProfiler()
+        else:
+            return await self.app(scope, receive, send)
+
+        async def send_with_profile_id(message):
+            if name and message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", name.encode())]
+            await send(message)
+
+        # cProfile keeps one hook per thread, so a second concurrent admin
+        # profile only covers its worker threads, not the event loop.
+        owns_loop = isinstance(profiler, SampledProfiler) or not _loop_profiled
+        if owns_loop:
+            if isinstance(profiler, RequestProfiler):
+                _loop_profiled = True
+            profiler.enter()
+        token = _active_profiler.set(profiler)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _active_profiler.reset(token)
+            if owns_loop:
+                profiler.exit()
+                if isinstance(profiler, RequestProfiler):
+                    _loop_profiled = False
+            if name:
+                await asyncio.to_thread(profiler.save, name)
+
+app.add_middleware(ProfilingMiddleware)
+
+# --- Metrics ---
+METRICS = Counter()
+_metrics_lock = threading.Lock()
+
+def incr_metric(name: str, value: int = 1):
+    with _metrics_lock:
+        METRICS[name] += value
+
+# --- Model residency & keep-alive ---
+# Ollama unloads a model once its keep_alive expires, and the next request pays
+# the full load. We track which models we believe are resident (corrected by
+# polling /api/ps), pre-load models at startup, and size keep_alive from the
+# observed gap between requests.
+class ModelState:
+    def __init__(self):
+        self.arrivals = deque(maxlen=50)
+        self.expires_at = 0.0  # Wall-clock time Ollama is expected to unload the model
+        self.wanted_until = 0.0  # Wall-clock time we asked Ollama to keep it until
+        self.requests = 0
+        self.cold_starts = 0
+
+_model_states = {}
+_model_lock = threading.Lock()
+
+def _model_state(model: str) -> ModelState:
+    if model not in _model_states:
+        _model_states[model] = ModelState()
+    return _model_states[model]
+
+def _business_hours_end(now: datetime) -> Optional[datetime]:
+    """Return today's closing time if `now` is within BUSINESS_HOURS, else None."""
+    if not _business_hours:
+        return None
+    start, end = _business_hours
+    if start <= now.hour < end:
+        return now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(hours=end)
+    return None
+
+def tuned_keep_alive(state: ModelState) -> int:
+    """Keep a model loaded for a few typical request gaps, and until closing time during
+    business hours if it has had at least BUSINESS_HOURS_MIN_RATE requests in the last hour."""
+    gaps = sorted(b - a for a, b in zip(state.arrivals, list(state.arrivals)[1:]))
+    keep_alive = KEEP_ALIVE_MIN
+    if gaps:
+        keep_alive = min(max(int(4 * gaps[len(gaps) // 2]), KEEP_ALIVE_MIN), KEEP_ALIVE_MAX)
+    closing = _business_hours_end(datetime.now())
+    recent = sum(1 for arrival in state.arrivals if arrival > time.time() - 3600)
+    if closing and state.arrivals and recent >= BUSINESS_HOURS_MIN_RATE:
+        keep_alive = max(keep_alive, int((closing - datetime.now()).total_seconds()))
+    return keep_alive
+
+def record_model_request(model: str) -> int:
+    """Count the request (and a cold start if the model isn't resident); return the keep_alive to send."""
+    now = time.time()
+    with _model_lock:
+        state = _model_state(model)
+        state.requests += 1
+        if now >= state.expires_at:
+            state.cold_starts += 1
+            incr_metric("model_cold_starts")
+        state.arrivals.append(now)
+        keep_alive = tuned_keep_alive(state)
+        state.expires_at = state.wanted_until = now + keep_alive
+    return keep_alive
+
+def preload_model(model: str, keep_alive: int) -> bool:
+    """Load `model` (or extend its residency) without generating anything."""
+    import requests
+    try:
+        r = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json={"model": model, "keep_alive": keep_alive}, timeout=300)
+    except Exception as e:
+        print(f"[WARNING] Could not pre-load model {model}: {e}")
+        return False
+    if r.status_code != 200:
+        print(f"[WARNING] Could not pre-load model {model}: HTTP {r.status_code}")
+        return False
+    with _model_lock:
+        state = _model_state(model)
+        state.expires_at = time.time() + keep_alive
+        state.wanted_until = max(state.wanted_until, state.expires_at)
+    return True
+
+def refresh_model_residency():
+    """Sync our residency view with the models Ollama actually has loaded."""
+    import requests
+    try:
+        r = requests.get(f"{OLLAMA_BASE_URL}/api/ps", timeout=3)
+        loaded = {m.get("name"): m.get("expires_at") for m in r.json().get("models", [])}
+    except Exception as e:
+        print(f"[WARNING] Could not query loaded models: {e}")
+        return
+    now = time.time()
+    with _model_lock:
+        for model in set(loaded) | set(_model_states):
+            state = _model_state(model)
+            if model not in loaded:
+                state.expires_at = 0.0
+                continue
+            try:
+                # Ollama reports nanosecond precision; trim to microseconds for fromisoformat
+                expires = loaded[model]
+                head, dot, tail = expires.partition(".")
+                if dot:
+                    digits = "".join(itertools.takewhile(str.isdigit, tail))
+                    expires = f"{head}.{digits[:6]}{tail[len(digits):]}"
+                state.expires_at = datetime.fromisoformat(expires.replace("Z", "+00:00")).timestamp()
+            except (AttributeError, ValueError):
+                state.expires_at = now + MODEL_POLL_INTERVAL
+
+def reapply_keep_alive():
+    """Extend resident models Ollama will unload sooner than we asked.
+
+    Requests through /v1/responses can't carry keep_alive, so Ollama resets the
+    model to its default; this re-applies the tuned value once per poll instead
+    of after every generation.
+    """
+    now = time.time()
+    with _model_lock:
+        short = [(model, int(state.wanted_until - now)) for model, state in _model_states.items()
+                 if now < state.expires_at and state.wanted_until - state.expires_at > MODEL_POLL_INTERVAL]
+    for model, keep_alive in short:
+        incr_metric("model_keep_alive_reapplied")
+        preload_model(model, keep_alive)
+
+def _keep_alive_loop():
+    for model in PREWARM_MODELS:
+        print(f"[INFO] Pre-loading model: {model}")
+        with _model_lock:
+            keep_alive = tuned_keep_alive(_model_state(model))
+        preload_model(model, keep_alive)
+    while True:
+        time.sleep(MODEL_POLL_INTERVAL)
+        refresh_model_residency()
+        reapply_keep_alive()
+        if not _business_hours_end(datetime.now()):
+            continue
+        # Re-warm configured models Ollama evicted so business-hours traffic never pays the load
+        for model in PREWARM_MODELS:
+            with _model_lock:
+                state = _model_state(model)
+                resident = time.time() < state.expires_at
+                keep_alive = tuned_keep_alive(state)
+            if not resident:
+                print(f"[INFO] Re-warming evicted model: {model}")
+                incr_metric("model_rewarms")
+                preload_model(model, keep_alive)
+
+@app.on_event("startup")
+def start_model_keep_alive():
+    threading.Thread(target=_keep_alive_loop, name="model-keep-alive", daemon=True).start()
+
+def model_residency_snapshot() -> dict:
+    now = time.time()
+    with _model_lock:
+        return {
+            model: {
+                "resident": now < state.expires_at,
+                "expires_in": max(0, int(state.expires_at - now)),
+                "requests": state.requests,
+                "cold_starts": state.cold_starts,
+            }
+            for model, state in _model_states.items()
+        }
+
+# --- In-flight generations ---
+# Every client request (and every job generation) is tracked from start to end,
+# including the gaps between its upstream calls, so it can be aborted when the
+# client disconnects or the gateway drains. Aborting shuts down the upstream
+# socket, which makes Ollama stop generating and frees its slot.
+DRAINING = False
+_current_flight = contextvars.ContextVar("current_flight", default=None)
+_in_flight = set()
+_flights_lock = threading.Lock()
+_avg_generation_seconds = 0.0  # Moving average of completed generations, for saved-time estimates
+
+class InFlight:
+    """Cancellation handle for one client request, which may run several upstream generations."""
+    def __init__(self):
+        self.cancelled = False
+        self.cancel_status = 499  # Client Closed Request
+        self.upstreams = set()
+        self.active = 0  # Upstream calls currently open
+        self.holds = 0  # Requests or calls keeping this flight in `_in_flight`
+
+    def cancel(self, status_code: int = 499):
+        self.cancelled = True
+        self.cancel_status = status_code
+        with _flights_lock:
+            upstreams = list(self.upstreams)
+        for upstream in upstreams:
+            _abort_upstream(upstream)
+
+def _hold_flight(flight: InFlight, new_work: bool = False):
+    """Register `flight` in `_in_flight`; new work is refused with 503 while draining."""
+    with _flights_lock:
+        if new_work and DRAINING and flight not in _in_flight:
+            raise HTTPException(status_code=503, detail="Server is draining; retry shortly.")
+        flight.holds += 1
+        _in_flight.add(flight)
+
+def _release_flight(flight: InFlight):
+    with _flights_lock:
+        flight.holds -= 1
+        if not flight.holds:
+            _in_flight.discard(flight)
+
+def _abort_upstream(response):
+    """Shut down the upstream socket so a blocked read in the worker thread returns."""
+    # The socket sits on the pooled connection for keep-alive responses, or only
+    # on the response's file object once http.client has released the connection.
+    for get_sock in (lambda: response.raw._connection.sock, lambda: response.raw._fp.fp.raw._sock):
+        try:
+            get_sock().shutdown(socket.SHUT_RDWR)
+            return
+        except Exception:
+            continue
+    # Relies on urllib3/http.client internals; surface it if they change
+    incr_metric("upstream_abort_failures")
+    print("[WARNING] Could not abort upstream generation; it will run to completion")
+
+class ClientDisconnectMiddleware:
+    """Cancel a request's upstream generation as soon as its client disconnects.
+
+    The (small, JSON) request body is buffered up front so that the client's
+    receive channel can be watched for `http.disconnect` while the endpoint runs.
+    New client work is refused with 503 while the gateway is draining; polling
+    `GET /jobs/{id}` stays open so clients can still collect finished results.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        polling_job = scope["method"] == "GET" and scope["path"].startswith("/jobs/")
+        client_work = not polling_job and any(name == b"x-api-key" for name, _ in scope["headers"])
+        flight = InFlight()
+        if client_work:
+            # Held for the whole request, so a drain also waits for work between upstream calls
+            try:
+                _hold_flight(flight, new_work=True)
+            except HTTPException as e:
+                response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers={"Retry-After": "30"})
+                return await response(scope, receive, send)
+        try:
+            await self._run(scope, receive, send, flight)
+        finally:
+            if client_work:
+                _release_flight(flight)
+
+    async def _run(self, scope, receive, send, flight: InFlight):
+
+        messages = []
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] == "http.disconnect" or not message.get("more_body", False):
+                break
+
+        disconnected = asyncio.Event()
+        # Checked now: replay_receive empties `messages` while the app runs
+        body_complete = messages[-1]["type"] != "http.disconnect"
+
+        async def replay_receive():
+            if messages:
+                return messages.pop(0)
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def watch():
+            if body_complete:
+                while (await receive())["type"] != "http.disconnect":
+                    pass
+            disconnected.set()
+            flight.cancel()
+
+        token = _current_flight.set(flight)
+        watcher = asyncio.create_task(watch())
+        try:
+            await self.app(scope, replay_receive, send)
+        finally:
+            watcher.cancel()
+            _current_flight.reset(token)
+
+app.add_middleware(ClientDisconnectMiddleware)
+
+def _record_cancellation(started: float):
+    elapsed = time.time() - started
+    incr_metric("generations_cancelled")
+    with _metrics_lock:
+        METRICS["gpu_seconds_saved"] = round(METRICS["gpu_seconds_saved"] + max(0.0, _avg_generation_seconds - elapsed), 3)
+
+def _record_completion(started: float):
+    global _avg_generation_seconds
+    elapsed = time.time() - started
+    with _metrics_lock:
+        _avg_generation_seconds = elapsed if not _avg_generation_seconds else 0.9 * _avg_generation_seconds + 0.1 * elapsed
+
+def cancel_in_flight() -> int:
+    with _flights_lock:
+        flights = list(_in_flight)
+    for flight in flights:
+        flight.cancel(503)
+    return len(flights)
+
+# --- Ollama helpers ---
+def _read_ollama_stream(r, responses_api: bool, flight: InFlight) -> dict:
+    """Reassemble a streamed Ollama reply into the same JSON a non-streaming call returns."""
+    result, text = {}, []
+    for line in r.iter_lines():
+        if flight.cancelled:
+            break
+        if not line:
+            continue
+        if responses_api:
+            # Server-sent events; the final `response.completed` event carries the full response
+            if line.startswith(b"data:"):
+                event = json.loads(line[5:])
+                if event.get("type") == "response.completed":
+                    result = event.get("response", {})
+        else:
+            chunk = json.loads(line)
+            text.append(chunk.get("response", ""))
+            if chunk.get("done"):
+                result = chunk
+    if not responses_api:
+        result["response"] = "".join(text)
+    return result
+
+def call_ollama(prompt: str, context: Optional[list] = None, native: bool = False) -> dict:
+    """Send a prompt to Ollama, optionally continuing a conversation, and return its JSON response.
+
+    `native` forces Ollama's /api/generate even when OLLAMA_URL is /v1/responses;
+    only the native API returns and accepts a conversation `context`.
+    The reply is streamed so the generation can be aborted mid-way if the
+    client disconnects (HTTP 499) or the gateway drains (HTTP 503).
+    """
+    import requests
+    keep_alive = record_model_request(OLLAMA_MODEL)
+    # Support both older `prompt`-style endpoints and Ollama's /v1/responses
+    responses_api = "/v1/responses" in OLLAMA_URL and not native
+    url = f"{OLLAMA_BASE_URL}/api/generate" if native and "/v1/responses" in OLLAMA_URL else OLLAMA_URL
+    if responses_api:
+        payload = {"model": OLLAMA_MODEL, "input": prompt, "stream": True}
+    else:
+        payload = {"model": OLLAMA_MODEL, "prompt": prompt, "keep_alive": keep_alive, "stream": True}
+        if context:
+            payload["context"] = context
+
+    flight = _current_flight.get() or InFlight()
+    started = time.time()
+    _hold_flight(flight, new_work=True)
+    with _flights_lock:
+        flight.active += 1
+    try:
+        if flight.cancelled:
+            raise HTTPException(status_code=flight.cancel_status, detail="Generation cancelled.")
+        r = requests.post(url, json=payload, stream=True)
+        with _flights_lock:
+            flight.upstreams.add(r)
+        try:
+            if r.status_code != 200:
+                raise HTTPException(status_code=502, detail="Ollama error")
+            try:
+                result = _read_ollama_stream(r, responses_api, flight)
+            except Exception:
+                if not flight.cancelled:
+                    raise
+            if flight.cancelled:
+                _record_cancellation(started)
+                raise HTTPException(status_code=flight.cancel_status, detail="Generation cancelled.")
+        finally:
+            with _flights_lock:
+                flight.upstreams.discard(r)
+            r.close()
+    finally:
+        with _flights_lock:
+            flight.active -= 1
+        _release_flight(flight)
+    _record_completion(started)
+    return result
+
+def response_text(result: dict) -> str:
+    """Extract the generated text from either a native or a /v1/responses reply."""
+    if "response" in result:
+        return result["response"]
+    if result.get("output_text"):
+        return result["output_text"]
+    return "".join(
+        part.get("text", "")
+        for item in result.get("output", [])
+        for part in item.get("content", []) or []
+        if isinstance(part, dict)
+    )
+
+# --- Summarization ---
+# Long documents are split into overlapping chunks that are summarized in
+# parallel (map), then the partial summaries are merged in groups until one
+# summary remains (reduce). Fan-out is bounded by SUMMARY_FANOUT.
+SUMMARY_MAP_PROMPT = "Summarize the following section of a longer document. Keep key facts, names, numbers and decisions.\n\n{text}"
+SUMMARY_REDUCE_PROMPT = "Combine these partial summaries of the same document into one coherent summary without repeating points.\n\n{text}"
+
+def split_text(text: str, size: int, overlap: int) -> list:
+    """Split `text` into chunks of about `size` characters, breaking on whitespace, with `overlap` shared."""
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            cut = max(text.rfind("\n", start + size // 2, end), text.rfind(" ", start + size // 2, end))
+            if cut != -1:
+                end = cut
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        # Begin the overlap on a word boundary rather than mid-word
+        start = next((i + 1 for i in range(start - 1, end) if text[i].isspace()), start)
+    return [chunk for chunk in chunks if chunk]
+
+def group_summaries(summaries: list, size: int) -> list:
+    """Pack consecutive summaries into groups of at most `size` characters.
+
+    Every group but the last holds at least two summaries; the last may hold one.
+    """
+    groups, current = [], []
+    for summary in summaries:
+        if len(current) >= 2 and sum(map(len, current)) + len(summary) > size:
+            groups.append(current)
+            current = []
+        current.append(summary)
+    groups.append(current)
+    return groups
+
+def summarize_stream(text: str):
+    """Yield NDJSON progress events while running the map and reduce passes."""
+    # All calls share the client's cancellation handle, so a disconnect or a
+    # failed chunk aborts every parallel upstream call of this request.
+    flight = _current_flight.get() or InFlight()
+
+    def call(prompt):
+        _current_flight.set(flight)
+        return call_ollama(prompt)
+
+    def run(prompts, stage):
+        results = [None] * len(prompts)
+        with ThreadPoolExecutor(max_workers=SUMMARY_FANOUT) as pool:
+            futures = {
+                pool.submit(contextvars.copy_context().run, profiled(call), prompt): i
+                for i, prompt in enumerate(prompts)
+            }
+            try:
+                for future in as_completed(futures):
+                    i = futures[future]
+                    results[i] = response_text(future.result()).strip()
+                    yield json.dumps({"event": stage, "index": i, "total": len(prompts), "summary": results[i]}) + "\n"
+            except BaseException:
+                # Drop queued chunks and abort running ones before the pool waits on them
+                for future in futures:
+                    future.cancel()
+                flight.cancel()
+                raise
+        return results
+
+    chunks = split_text(text, SUMMARY_CHUNK_CHARS, SUMMARY_CHUNK_OVERLAP)
+    yield json.dumps({"event": "start", "chunks": len(chunks)}) + "\n"
+    try:
+        summaries = yield from run([SUMMARY_MAP_PROMPT.format(text=chunk) for chunk in chunks], "chunk")
+        level = 0
+        while len(summaries) > 1:
+            level += 1
+            groups = group_summaries(summaries, SUMMARY_CHUNK_CHARS)
+            # A trailing group of one is carried to the next level as is, not re-summarized
+            prompts = [SUMMARY_REDUCE_PROMPT.format(text="\n\n".join(group)) for group in groups if len(group) > 1]
+            reduced = iter((yield from run(prompts, f"reduce-{level}")))
+            summaries = [next(reduced) if len(group) > 1 else group[0] for group in groups]
+    except HTTPException as e:
+        yield json.dumps({"event": "error", "status": e.status_code, "detail": e.detail}) + "\n"
+        return
+    except Exception as e:
+        # e.g. Ollama unreachable; the status line is already sent, so report it in-band
+        yield json.dumps({"event": "error", "status": 502, "detail": f"Ollama error: {e}"}) + "\n"
+        return
+    yield json.dumps({"event": "done", "summary": summaries[0] if summaries else ""}) + "\n"
+
+# --- Ticket retrieval index ---
+# Resolved tickets are embedded into an append-only float32 matrix on disk
+# (TICKET_INDEX_PATH, dimension and embedding model in a `.json` sidecar) that is memory-mapped, so
+# opening it is instant and only the pages a search touches are read. Row `i`
+# of the matrix is row `i` of the `tickets` table. Vectors are stored unit-length
+# so cosine similarity is a single matrix-vector product.
+def embed_texts(texts: list) -> list:
+    """Embed a batch of texts with one array-input call to Ollama's /api/embed."""
+    import requests
+    keep_alive = record_model_request(EMBED_MODEL)
+    try:
+        r = requests.post(f"{OLLAMA_BASE_URL}/api/embed", json={"model": EMBED_MODEL, "input": texts, "keep_alive": keep_alive}, timeout=300)
+    except requests.RequestException:
+        raise HTTPException(status_code=502, detail="Ollama embedding error")
+    if r.status_code != 200:
+        raise HTTPException(status_code=502, detail="Ollama embedding error")
+    return r.json()["embeddings"]
+
+# --- Embedding micro-batcher ---
+# Concurrent /embed (and ticket search) requests are queued and merged: the
+# first request opens a EMBED_BATCH_WINDOW_MS window, everything arriving in it
+# (up to EMBED_MAX_BATCH inputs) goes to Ollama as one array-input call, and the
+# vectors are scattered back to each caller's future. Requests larger than
+# EMBED_MAX_BATCH are split into several queue items and reassembled.
+class EmbedBatcher:
+    def __init__(self, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=2)  # Next window fills while a batch is upstream
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, texts: list) -> Future:
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name="embed-batcher", daemon=True)
+                self.thread.start()
+        incr_metric("embed_requests")
+        now = time.time()
+        parts = []
+        for i in range(0, len(texts), self.max_batch):
+            part = Future()
+            self.queue.put((texts[i:i + self.max_batch], part, now))
+            parts.append(part)
+        if len(parts) == 1:
+            return parts[0]
+        future, gather_lock = Future(), threading.Lock()
+        def gather(part):
+            with gather_lock:  # Parts can finish concurrently on different pool threads
+                if future.done():
+                    return
+                if part.exception():
+                    future.set_exception(part.exception())
+                elif all(p.done() for p in parts):
+                    future.set_result([vector for p in parts for vector in p.result()])
+        for part in parts:
+            part.add_done_callback(gather)
+        return future
+
+    def _loop(self):
+        pending = None  # Item that didn't fit in the previous batch
+        while True:
+            items = [pending or self.queue.get()]
+            pending = None
+            size = len(items[0][0])
+            deadline = time.time() + self.window
+            while size < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if size + len(item[0]) > self.max_batch:
+                    pending = item
+                    break
+                items.append(item)
+                size += len(item[0])
+            self.pool.submit(self._dispatch, items)
+
+    def _dispatch(self, items: list):
+        now = time.time()
+        with _metrics_lock:
+            METRICS["embed_batches"] += 1
+            METRICS["embed_queue_items"] += len(items)  # Requests, or parts of split requests
+            METRICS["embed_inputs"] += sum(len(texts) for texts, _, _ in items)
+            METRICS["embed_queue_delay_ms"] += int(sum(now - queued for _, _, queued in items) * 1000)
+            METRICS["embed_max_batch_size"] = max(METRICS["embed_max_batch_size"], sum(len(texts) for texts, _, _ in items))
+        try:
+            vectors = embed_texts([text for texts, _, _ in items for text in texts])
+        except Exception as e:
+            for _, future, _ in items:
+                future.set_exception(e)
+            return
+        offset = 0
+        for texts, future, _ in items:
+            future.set_result(vectors[offset:offset + len(texts)])
+            offset += len(texts)
+
+embed_batcher = EmbedBatcher(EMBED_BATCH_WINDOW_MS, EMBED_MAX_BATCH)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class TicketIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self.meta_path = path + ".json"
+        self.lock = threading.Lock()
+        self.dim = None
+        self.model = None
+        self.vectors = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.dim, self.model = meta["dim"], meta.get("model")
+            if self.model != EMBED_MODEL:
+                print(f"[WARNING] Ticket index at {path} was built with {self.model}, not EMBED_MODEL={EMBED_MODEL}; "
+                      "/ticket/resolve runs without similar tickets and ingest is refused until it is rebuilt.")
+            if os.path.exists(self.path):
+                # Drop a partially written trailing row left by an interrupted append
+                row_bytes = 4 * self.dim
+                size = os.path.getsize(self.path)
+                if size % row_bytes:
+                    os.truncate(self.path, size - size % row_bytes)
+            self._remap()
+
+    def _remap(self):
+        rows = os.path.getsize(self.path) // (4 * self.dim) if os.path.exists(self.path) else 0
+        self.vectors = np.memmap(self.path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+
+    def __len__(self) -> int:
+        vectors = self.vectors
+        return 0 if vectors is None else vectors.shape[0]
+
+    @property
+    def usable(self) -> bool:
+        """False when the index was built with another embedding model."""
+        return self.model == EMBED_MODEL
+
+    def _check(self, dim: int):
+        # Vectors from another model live in a different space even when the sizes match
+        if self.model != EMBED_MODEL:
+            raise HTTPException(status_code=409, detail=f"Ticket index was built with {self.model}, not {EMBED_MODEL}; rebuild it.")
+        if dim != self.dim:
+            raise HTTPException(status_code=409, detail=f"Embedding dimension {dim} does not match index dimension {self.dim}.")
+
+    def append(self, vectors: np.ndarray) -> int:
+        """Append embeddings without rebuilding; return the row number of the first one."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        with self.lock:
+            if self.dim is None:
+                self.dim, self.model = int(vectors.shape[1]), EMBED_MODEL
+                with open(self.meta_path, "w") as f:
+                    json.dump({"dim": self.dim, "model": self.model}, f)
+            else:
+                self._check(vectors.shape[1])
+            start = len(self)
+            with open(self.path, "ab") as f:
+                f.write(vectors.tobytes())
+            self._remap()
+        return start
+
+    def search(self, query, k: int) -> list:
+        """Return up to `k` (row, score) pairs by cosine similarity, best first."""
+        vectors = self.vectors
+        if vectors is None or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        self._check(query.shape[-1])
+        scores = vectors @ _normalize(query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+ticket_index = TicketIndex(TICKET_INDEX_PATH)
+_ticket_ingest_lock = threading.Lock()
+
+def ingest_tickets(tickets: list) -> int:
+    """Embed and append resolved tickets in batches; returns the index size afterwards."""
+    batches = [tickets[i:i + TICKET_EMBED_BATCH] for i in range(0, len(tickets), TICKET_EMBED_BATCH)]
+    now = datetime.utcnow().isoformat()
+    # Serialized so vector rows and `tickets` rows stay aligned; embedding of the
+    # next batches overlaps with writing the current one.
+    with _ticket_ingest_lock, ThreadPoolExecutor(max_workers=TICKET_EMBED_WORKERS) as pool:
+        conn = get_db()
+        try:
+            for batch, vectors in zip(batches, pool.map(lambda b: embed_texts([t.ticket for t in b]), batches)):
+                start = ticket_index.append(vectors)
+                conn.executemany("INSERT OR REPLACE INTO tickets (row, ticket, resolution, created_at) VALUES (?, ?, ?, ?)",
+                                 [(start + i, t.ticket, t.resolution, now) for i, t in enumerate(batch)])
+                conn.commit()
+        finally:
+            conn.close()
+    return len(ticket_index)
+
+def similar_tickets(ticket: str, k: int) -> list:
+    # Nothing to search: don't call the embedding model at all
+    if k <= 0 or not len(ticket_index) or not ticket_index.usable:
+        return []
+    hits = ticket_index.search(embed_batcher.submit([ticket]).result()[0], k)
+    if not hits:
+        return []
+    conn = get_db()
+    rows = {row["row"]: row for row in conn.execute(
+        f"SELECT * FROM tickets WHERE row IN ({','.join('?' * len(hits))})", [row for row, _ in hits])}
+    conn.close()
+    return [
+        {"row": row, "score": round(score, 4), "ticket": rows[row]["ticket"], "resolution": rows[row]["resolution"]}
+        for row, score in hits if row in rows
+    ]
+
+TICKET_RESOLVE_PROMPT = (
+    "You are a support engineer. Propose a resolution for the new ticket, "
+    "reusing the similar resolved tickets below where they apply.\n\n{examples}\n\nNew ticket:\n{ticket}\n\nResolution:"
+)
+
+# --- Conversation sessions ---
+# Each session keeps Ollama's `context` token array so follow-up turns send only
+# the new message instead of the whole history. Session turns always use the
+# native /api/generate: the OpenAI-compatible /v1/responses is stateless and
+# would drop the history. Keyed by (API key hash, session id); least recently
+# used sessions are evicted past SESSION_MAX. A session runs one turn at a time.
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+def create_session(api_key: str) -> str:
+    import secrets
+    session_id = secrets.token_urlsafe(16)
+    with _sessions_lock:
+        _sessions[(hash_key(api_key), session_id)] = {"context": None, "turns": 0, "busy": False}
+        while len(_sessions) > SESSION_MAX:
+            _sessions.popitem(last=False)
+            incr_metric("sessions_evicted")
+    return session_id
+
+def begin_turn(api_key: str, session_id: str) -> dict:
+    """Claim a session for one turn; call end_turn() when it finishes."""
+    with _sessions_lock:
+        entry = _sessions.get((hash_key(api_key), session_id))
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Session not found or expired. Start a new session and resend the history.")
+        if entry["busy"]:
+            # Both turns would continue from the same context and one would be lost
+            raise HTTPException(status_code=409, detail="A turn is already running in this session; retry when it finishes.")
+        entry["busy"] = True
+        _sessions.move_to_end((hash_key(api_key), session_id))
+        return entry
+
+def end_turn(session: dict, result: Optional[dict] = None) -> int:
+    """Release the session, storing the turn's continuation if it succeeded; returns the turn count."""
+    with _sessions_lock:
+        if result is not None:
+            # Store only Ollama's continuation handle; the response itself is not kept
+            session["context"] = result.pop("context", None)
+            session["turns"] += 1
+        session["busy"] = False
+        return session["turns"]
+
+def delete_session(api_key: str, session_id: str) -> bool:
+    with _sessions_lock:
+        return _sessions.pop((hash_key(api_key), session_id), None) is not None
+
+# --- Idempotency keys ---
+# A /generate request with an `Idempotency-Key` header records a future under
+# (API key hash, idempotency key). A retry attaches to the running generation or
+# gets the stored result instead of calling Ollama again. The generation runs
+# detached from the first client's connection, so a disconnect doesn't cancel
+# the work the retry is waiting for. Failures are not stored.
+_idempotent = OrderedDict()  # scope -> (prompt fingerprint, future, expires_at)
+_idempotent_lock = threading.Lock()
+
+def run_idempotent(api_key: str, idempotency_key: str, prompt: str) -> dict:
+    scope = (hash_key(api_key), idempotency_key)
+    fingerprint = hashlib.sha256(prompt.encode()).hexdigest()
+    now = time.time()
+    with _idempotent_lock:
+        # Entries share one TTL, so the oldest are always at the front
+        while _idempotent and next(iter(_idempotent.values()))[2] < now:
+            _idempotent.popitem(last=False)
+        entry = _idempotent.get(scope)
+        if entry and entry[0] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request.")
+        owner = entry is None
+        if owner:
+            future = Future()
+            _idempotent[scope] = (fingerprint, future, now + IDEMPOTENCY_TTL)
+            while len(_idempotent) > IDEMPOTENCY_MAX:
+                _idempotent.popitem(last=False)
+        else:
+            future = entry[1]
+    if not owner:
+        incr_metric("idempotent_replays")
+        return future.result()
+
+    def run():
+        try:
+            future.set_result(call_ollama(prompt))
+        except BaseException as e:
+            with _idempotent_lock:
+                _idempotent.pop(scope, None)
+            future.set_exception(e)
+
+    # A plain thread starts with an empty context, so the generation gets its own
+    # InFlight handle instead of the requesting client's.
+    threading.Thread(target=run, daemon=True).start()
+    return future.result()
+
+# --- Job queue ---
+# Long generations run as jobs: POST /jobs stores the prompt in the SQLite
+# `jobs` table and returns immediately; JOB_WORKERS threads claim queued jobs in
+# order, run them and store the result for JOB_RESULT_TTL seconds. Clients poll
+# or long-poll GET /jobs/{id}, or pass a webhook_url to be called on completion.
+_job_wakeup = threading.Condition()
+_job_events = {}  # job id -> threading.Event, set when the job finishes (for long-polls)
+_job_events_lock = threading.Lock()
+
+def _job_event(job_id: str) -> threading.Event:
+    with _job_events_lock:
+        if job_id not in _job_events:
+            _job_events[job_id] = threading.Event()
+        return _job_events[job_id]
+
+def submit_job(api_key: str, prompt: str, webhook_url: Optional[str]) -> str:
+    import secrets
+    job_id = secrets.token_urlsafe(16)
+    conn = get_db()
+    conn.execute("INSERT INTO jobs (id, key_hash, prompt, webhook_url, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                 (job_id, hash_key(api_key), prompt, webhook_url, time.time()))
+    conn.commit()
+    conn.close()
+    incr_metric("jobs_submitted")
+    with _job_wakeup:
+        _job_wakeup.notify()
+    return job_id
+
+def _claim_job() -> Optional[sqlite3.Row]:
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT * FROM jobs WHERE status='queued' ORDER BY created_at LIMIT 1").fetchone()
+        if row:
+            conn.execute("UPDATE jobs SET status='running' WHERE id=?", (row["id"],))
+        conn.commit()
+        return row
+    finally:
+        conn.close()
+
+def _finish_job(job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+    now = time.time()
+    conn = get_db()
+    conn.execute("UPDATE jobs SET status=?, result=?, error=?, finished_at=?, expires_at=? WHERE id=?",
+                 (status, json.dumps(result) if result is not None else None, error, now, now + JOB_RESULT_TTL, job_id))
+    conn.commit()
+    conn.close()
+    _job_event(job_id).set()
+
+def webhook_url_error(url: str) -> Optional[str]:
+    """Why `url` may not be used as a job webhook, or None if it may.
+
+    Webhooks are sent from the gateway's network, so unless JOB_WEBHOOK_ALLOW_PRIVATE
+    is set they may only reach public addresses (not Ollama or the admin API).
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return "webhook_url must be an http(s) URL."
+    if JOB_WEBHOOK_ALLOW_PRIVATE:
+        return None
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, ValueError):
+        return "webhook_url host cannot be resolved."
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if not ip.is_global or ip.is_multicast:
+            return "webhook_url must point to a public address."
+    return None
+
+def _send_job_webhook(job: sqlite3.Row, status: str, result: Optional[dict], error: Optional[str]):
+    import requests
+    # Checked again at send time, in case the name now resolves somewhere else
+    reason = webhook_url_error(job["webhook_url"])
+    if reason:
+        print(f"[WARNING] Job {job['id']} webhook skipped: {reason}")
+        return
+    try:
+        requests.post(job["webhook_url"], json={"job_id": job["id"], "status": status, "result": result, "error": error},
+                      timeout=10, allow_redirects=False)
+    except Exception as e:
+        print(f"[WARNING] Job {job['id']} webhook failed: {e}")
+
+def _purge_expired_jobs():
+    conn = get_db()
+    expired = [row["id"] for row in conn.execute("SELECT id FROM jobs WHERE expires_at < ?", (time.time(),))]
+    conn.execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),))
+    conn.commit()
+    conn.close()
+    with _job_events_lock:
+        for job_id in expired:
+            _job_events.pop(job_id, None)
+
+def _requeue_job(job_id: str):
+    conn = get_db()
+    conn.execute("UPDATE jobs SET status='queued' WHERE id=?", (job_id,))
+    conn.commit()
+    conn.close()
+
+def _run_next_job():
+    """Claim and run one queued job, or wait for one to be submitted."""
+    if DRAINING:
+        # Leave queued jobs alone until the drain is lifted (or the process restarts)
+        with _job_wakeup:
+            _job_wakeup.wait(timeout=1)
+        return
+    job = _claim_job()
+    if job is None:
+        _purge_expired_jobs()
+        # Also re-check periodically for jobs queued by another process
+        with _job_wakeup:
+            _job_wakeup.wait(timeout=5)
+        return
+    try:
+        try:
+            result, error, status = call_ollama(job["prompt"]), None, "done"
+        except HTTPException as e:
+            if DRAINING and e.status_code == 503:
+                # Cancelled by a drain: put it back so it runs after the restart
+                _requeue_job(job["id"])
+                return
+            result, error, status = None, str(e.detail), "failed"
+        except Exception as e:
+            result, error, status = None, str(e), "failed"
+        _finish_job(job["id"], status, result, error)
+    except Exception:
+        # Don't leave the job stuck in `running` if its row couldn't be updated
+        try:
+            _requeue_job(job["id"])
+        except Exception:
+            pass
+        raise
+    incr_metric(f"jobs_{status}")
+    if job["webhook_url"]:
+        _send_job_webhook(job, status, result, error)
+
+def _job_worker():
+    backoff = 0.5
+    while True:
+        try:
+            _run_next_job()
+            backoff = 0.5
+        except Exception as e:
+            # e.g. "database is locked" while another writer holds the DB; keep the worker alive
+            incr_metric("job_worker_errors")
+            print(f"[WARNING] Job worker error: {e}; retrying in {backoff:.1f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, JOB_WORKER_MAX_BACKOFF)
+
+@app.on_event("startup")
+def start_job_workers():
+    # Jobs left running by a previous process were interrupted; queue them again
+    conn = get_db()
+    conn.execute("UPDATE jobs SET status='queued' WHERE status='running'")
+    conn.commit()
+    conn.close()
+    for i in range(JOB_WORKERS):
+        threading.Thread(target=_job_worker, name=f"job-worker-{i}", daemon=True).start()
+
+def job_view(row: sqlite3.Row) -> dict:
+    return {
+        "job_id": row["id"],
+        "status": row["status"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+        "created_at": row["created_at"],
+        "finished_at": row["finished_at"],
+    }
+
 # --- Auth helpers ---
 def hash_key(key: str) -> str:
     return hmac.new(SECRET_KEY.encode(), key.encode(), hashlib.sha256).hexdigest()
 
+# Signed keys look like `sk1.<key id>.<expiry unix time>.<nonce>.<signature>` and
+# are verified in memory, only while SIGNED_KEYS is on and only for key ids we
+# know were issued. Revoked key ids go into a Bloom filter plus an exact set.
+# A background thread reloads both every REVOCATION_REFRESH seconds to see keys
+# and revocations from other workers; on the request path only a Bloom hit the
+# exact set can't confirm, or a validly signed id not seen yet, touches the DB.
+SIGNED_KEY_PREFIX = "sk1"
+
+class BloomFilter:
+    def __init__(self, bits: int = 1 << 20, hashes: int = 7):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray(bits // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+_revoked_bloom = BloomFilter()
+_revoked_ids = set()
+_issued_ids = set()  # Every key id in the DB; signed keys for other ids are forgeries
+_revocations_lock = threading.Lock()
+
+def revoke_key_id(key_id: int):
+    with _revocations_lock:
+        _revoked_bloom.add(str(key_id))
+        _revoked_ids.add(key_id)
+
+def issue_key_id(key_id: int):
+    with _revocations_lock:
+        _issued_ids.add(key_id)
+
+def load_revocations():
+    """Load issued and revoked key ids (also picks up keys created by other workers)."""
+    conn = get_db()
+    rows = conn.execute("SELECT id, revoked FROM api_keys").fetchall()
+    conn.close()
+    for row in rows:
+        issue_key_id(row["id"])
+        if row["revoked"]:
+            revoke_key_id(row["id"])
+
+load_revocations()
+
+def _revocation_refresh_loop():
+    # Runs off the request path, so verification only touches the DB on a Bloom hit
+    while True:
+        time.sleep(REVOCATION_REFRESH)
+        try:
+            load_revocations()
+        except Exception as e:
+            print(f"[WARNING] Could not reload key revocations: {e}")
+
+@app.on_event("startup")
+def start_revocation_refresh():
+    if SIGNED_KEYS:
+        threading.Thread(target=_revocation_refresh_loop, name="revocation-refresh", daemon=True).start()
+
+def is_key_id_issued(key_id: int) -> bool:
+    with _revocations_lock:
+        if key_id in _issued_ids:
+            return True
+    # Possibly created by another worker since the last reload
+    conn = get_db()
+    row = conn.execute("SELECT revoked FROM api_keys WHERE id=?", (key_id,)).fetchone()
+    conn.close()
+    if row is None:
+        return False
+    issue_key_id(key_id)
+    if row["revoked"]:
+        revoke_key_id(key_id)
+    return True
+
+def is_key_id_revoked(key_id: int) -> bool:
+    with _revocations_lock:
+        if str(key_id) not in _revoked_bloom:
+            return False
+        if key_id in _revoked_ids:
+            return True
+    # Bloom false positive: fall back to the DB
+    conn = get_db()
+    row = conn.execute("SELECT revoked FROM api_keys WHERE id=?", (key_id,)).fetchone()
+    conn.close()
+    return row is None or bool(row["revoked"])
+
+def sign_key_body(body: str) -> str:
+    digest = hmac.new(SECRET_KEY.encode(), body.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+def make_signed_key(key_id: int, expires: datetime) -> str:
+    import secrets
+    expires_ts = int(expires.replace(tzinfo=timezone.utc).timestamp())
+    body = f"{SIGNED_KEY_PREFIX}.{key_id}.{expires_ts}.{secrets.token_urlsafe(8)}"
+    return f"{body}.{sign_key_body(body)}"
+
+def verify_signed_key(key: str) -> bool:
+    body, _, signature = key.rpartition(".")
+    parts = body.split(".")
+    if len(parts) != 4 or not hmac.compare_digest(signature, sign_key_body(body)):
+        return False
+    try:
+        key_id, expires_ts = int(parts[1]), int(parts[2])
+    except ValueError:
+        return False
+    if time.time() > expires_ts:
+        return False
+    return is_key_id_issued(key_id) and not is_key_id_revoked(key_id)
+
 def verify_key(key: str) -> bool:
+    if SIGNED_KEYS and key.startswith(SIGNED_KEY_PREFIX + "."):
+        return verify_signed_key(key)
+    # Legacy random keys are looked up by hash
     conn = get_db()
     c = conn.cursor()
     h = hash_key(key)
@@ -124,6 +1525,7 @@ def require_api_key(request: Request):
     key = request.headers.get("x-api-key")
     if not key or not verify_key(key):
         raise HTTPException(status_code=401, detail="Invalid or expired API key.")
+    return key
 
 # --- Admin Auth ---
 def require_admin(credentials: HTTPBasicCredentials = Depends(security)):
@@ -140,6 +1542,27 @@ class KeyCreateRequest(BaseModel):
 class PromptRequest(BaseModel):
     prompt: str
 
+class SummarizeRequest(BaseModel):
+    text: str
+
+class Ticket(BaseModel):
+    ticket: str
+    resolution: str
+
+class TicketIngestRequest(BaseModel):
+    tickets: List[Ticket]
+
+class TicketResolveRequest(BaseModel):
+    ticket: str
+    top_k: int = TICKET_TOP_K
+
+class JobRequest(BaseModel):
+    prompt: str
+    webhook_url: Optional[str] = None  # Called with the result when the job finishes
+
+class EmbedRequest(BaseModel):
+    input: Union[str, List[str]]
+
 class TunnelURLRequest(BaseModel):
     tunnel_url: str
 
@@ -174,8 +1597,6 @@ def dashboard(request: Request, user: str = Depends(require_admin)):
 @app.post("/api/create")
 def create_key(req: KeyCreateRequest, user: str = Depends(require_admin)):
     import secrets
-    key = secrets.token_urlsafe(32)
-    key_hash = hash_key(key)
     now = datetime.utcnow()
     
     # Parse expires_at date (expected in ISO format: YYYY-MM-DD)
@@ -188,10 +1609,21 @@ def create_key(req: KeyCreateRequest, user: str = Depends(require_admin)):
         expires = now + timedelta(days=30)
     
     conn = get_db()
-    conn.execute("INSERT INTO api_keys (key_hash, created_at, expires_at) VALUES (?, ?, ?)", 
-                 (key_hash, now.isoformat(), expires.isoformat()))
+    if SIGNED_KEYS:
+        # The signed key embeds its row id, so insert first and fill in the hash after
+        cur = conn.execute("INSERT INTO api_keys (key_hash, created_at, expires_at) VALUES (?, ?, ?)",
+                           ("", now.isoformat(), expires.isoformat()))
+        key_id = cur.lastrowid
+        key = make_signed_key(key_id, expires)
+        conn.execute("UPDATE api_keys SET key_hash=? WHERE id=?", (hash_key(key), key_id))
+    else:
+        key = secrets.token_urlsafe(32)
+        conn.execute("INSERT INTO api_keys (key_hash, created_at, expires_at) VALUES (?, ?, ?)", 
+                     (hash_key(key), now.isoformat(), expires.isoformat()))
     conn.commit()
     conn.close()
+    if SIGNED_KEYS:
+        issue_key_id(key_id)
     return {"api_key": key, "expires_at": expires.isoformat()}
 
 @app.delete("/api/delete/{key_id}")
@@ -200,20 +1632,101 @@ def delete_key(key_id: int, user: str = Depends(require_admin)):
     conn.execute("UPDATE api_keys SET revoked=1 WHERE id=?", (key_id,))
     conn.commit()
     conn.close()
+    revoke_key_id(key_id)
     return {"revoked": True}
 
 @app.post("/generate")
-def generate(req: PromptRequest, _=Depends(require_api_key)):
-    import requests
-    # Support both older `prompt`-style endpoints and Ollama's /v1/responses
-    if "/v1/responses" in OLLAMA_URL:
-        payload = {"model": OLLAMA_MODEL, "input": req.prompt}
-    else:
-        payload = {"prompt": req.prompt}
-    r = requests.post(OLLAMA_URL, json=payload)
-    if r.status_code != 200:
-        raise HTTPException(status_code=502, detail="Ollama error")
-    return r.json()
+def generate(req: PromptRequest, request: Request, api_key: str = Depends(require_api_key)):
+    idempotency_key = request.headers.get("idempotency-key")
+    if idempotency_key:
+        return run_idempotent(api_key, idempotency_key, req.prompt)
+    return call_ollama(req.prompt)
+
+@app.post("/summarize")
+def summarize(req: SummarizeRequest, _=Depends(require_api_key)):
+    """Map-reduce summary of a long document, streamed as NDJSON progress events ending in `done`."""
+    if not req.text.strip():
+        raise HTTPException(status_code=400, detail="text must not be empty.")
+    return StreamingResponse(profiled_iter(summarize_stream(req.text)), media_type="application/x-ndjson")
+
+@app.post("/ticket/resolve")
+def resolve_ticket(req: TicketResolveRequest, _=Depends(require_api_key)):
+    """Suggest a resolution using the most similar past tickets as context."""
+    if not 0 <= req.top_k <= TICKET_MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"top_k must be between 0 and {TICKET_MAX_TOP_K}.")
+    similar = similar_tickets(req.ticket, req.top_k)
+    examples = "\n\n".join(f"Ticket:\n{t['ticket']}\nResolution:\n{t['resolution']}" for t in similar) or "(no similar tickets found)"
+    result = call_ollama(TICKET_RESOLVE_PROMPT.format(examples=examples, ticket=req.ticket))
+    return {"resolution": response_text(result).strip(), "similar": similar}
+
+@app.post("/ticket/ingest")
+def ingest_resolved_tickets(req: TicketIngestRequest, user: str = Depends(require_admin)):
+    """Add resolved tickets to the retrieval index (incremental, no rebuild). Admin only:
+    the index is shared and feeds every client's /ticket/resolve prompt."""
+    size = ingest_tickets(req.tickets)
+    return {"ingested": len(req.tickets), "index_size": size}
+
+@app.post("/jobs", status_code=202)
+def create_job(req: JobRequest, api_key: str = Depends(require_api_key)):
+    """Queue a generation and return its id immediately."""
+    if req.webhook_url:
+        reason = webhook_url_error(req.webhook_url)
+        if reason:
+            raise HTTPException(status_code=400, detail=reason)
+    return {"job_id": submit_job(api_key, req.prompt, req.webhook_url), "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0, api_key: str = Depends(require_api_key)):
+    """Fetch a job; with `wait`, long-poll up to that many seconds for it to finish."""
+    def load():
+        conn = get_db()
+        row = conn.execute("SELECT * FROM jobs WHERE id=? AND key_hash=?", (job_id, hash_key(api_key))).fetchone()
+        conn.close()
+        if row is None or (row["expires_at"] and row["expires_at"] < time.time()):
+            raise HTTPException(status_code=404, detail="Job not found or expired.")
+        return row
+
+    row = load()
+    if row["status"] in ("queued", "running") and wait > 0:
+        event = _job_event(job_id)
+        deadline = time.time() + min(wait, JOB_MAX_WAIT)
+        while not event.is_set() and time.time() < deadline:
+            await asyncio.sleep(0.25)
+        row = load()
+    return job_view(row)
+
+@app.post("/embed")
+async def embed(req: EmbedRequest, _=Depends(require_api_key)):
+    """Embed one or more texts; concurrent calls are merged into shared Ollama batches."""
+    texts = [req.input] if isinstance(req.input, str) else req.input
+    if not texts:
+        raise HTTPException(status_code=400, detail="input must not be empty.")
+    if len(texts) > EMBED_MAX_INPUTS:
+        raise HTTPException(status_code=400, detail=f"input must have at most {EMBED_MAX_INPUTS} texts.")
+    vectors = await asyncio.wrap_future(embed_batcher.submit(texts))
+    return {"model": EMBED_MODEL, "embeddings": vectors}
+
+@app.post("/sessions")
+def start_session(api_key: str = Depends(require_api_key)):
+    """Start a conversation; send each turn's new message to /sessions/{id}/generate."""
+    return {"session_id": create_session(api_key)}
+
+@app.post("/sessions/{session_id}/generate")
+def session_generate(session_id: str, req: PromptRequest, api_key: str = Depends(require_api_key)):
+    session = begin_turn(api_key, session_id)
+    try:
+        result = call_ollama(req.prompt, context=session["context"], native=True)
+    except BaseException:
+        end_turn(session)
+        raise
+    turn = end_turn(session, result)
+    return {"session_id": session_id, "turn": turn, **result}
+
+@app.delete("/sessions/{session_id}")
+def end_session(session_id: str, api_key: str = Depends(require_api_key)):
+    if not delete_session(api_key, session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired.")
+    return {"deleted": True}
 
 @app.get("/health")
 def health():
@@ -240,3 +1753,66 @@ def health():
 def get_tunnel_url():
     """Get the current tunnel URL (for frontend display)."""
     return {"tunnel_url": TUNNEL_URL}
+
+@app.get("/admin/metrics")
+def metrics(user: str = Depends(require_admin)):
+    with _metrics_lock:
+        counters = dict(METRICS)
+    with _sessions_lock:
+        active_sessions = len(_sessions)
+    with _flights_lock:
+        in_flight = sum(flight.active for flight in _in_flight)
+        in_flight_requests = len(_in_flight)
+    if counters.get("embed_batches"):
+        counters["embed_avg_batch_size"] = round(counters["embed_inputs"] / counters["embed_batches"], 2)
+        counters["embed_avg_queue_delay_ms"] = round(counters["embed_queue_delay_ms"] / counters["embed_queue_items"], 2)
+    conn = get_db()
+    jobs = {row["status"]: row["n"] for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+    conn.close()
+    return {"counters": counters, "models": model_residency_snapshot(), "sessions": active_sessions, "in_flight": in_flight, "in_flight_requests": in_flight_requests, "draining": DRAINING, "jobs": jobs}
+
+@app.post("/admin/drain")
+async def drain(timeout: float = DRAIN_TIMEOUT, user: str = Depends(require_admin)):
+    """Stop accepting client work, wait up to `timeout` seconds for in-flight requests, then cancel the rest."""
+    global DRAINING
+    DRAINING = True
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with _flights_lock:
+            if not _in_flight:
+                break
+        await asyncio.sleep(0.1)
+    cancelled = cancel_in_flight()
+    with _metrics_lock:
+        saved = METRICS["gpu_seconds_saved"]
+    return {"draining": True, "cancelled": cancelled, "gpu_seconds_saved": saved}
+
+@app.delete("/admin/drain")
+def resume(user: str = Depends(require_admin)):
+    global DRAINING
+    DRAINING = False
+    with _job_wakeup:
+        _job_wakeup.notify_all()
+    return {"draining": False}
+
+@app.on_event("shutdown")
+def shutdown_in_flight():
+    global DRAINING
+    DRAINING = True
+    cancelled = cancel_in_flight()
+    with _metrics_lock:
+        saved = METRICS["gpu_seconds_saved"]
+    print(f"[INFO] Shutdown: cancelled {cancelled} in-flight generation(s); cancellation saved ~{saved}s of GPU time")
+
+@app.get("/admin/profiles")
+def list_profiles(user: str = Depends(require_admin)):
+    """List stored profiles (`*.prof` per request, `sampled.folded` aggregate)."""
+    files = sorted(os.listdir(PROFILE_DIR))
+    return {"profiles": [{"name": f, "size": os.path.getsize(os.path.join(PROFILE_DIR, f))} for f in files]}
+
+@app.get("/admin/profiles/{name}")
+def download_profile(name: str, user: str = Depends(require_admin)):
+    path = os.path.join(PROFILE_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return FileResponse(path, filename=os.path.basename(name), media_type="application/octet-stream")
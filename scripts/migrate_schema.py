@@ -14,6 +14,25 @@ def migrate():
         expires_at TEXT,
         revoked INTEGER DEFAULT 0
     )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        key_hash TEXT NOT NULL,
+        prompt TEXT NOT NULL,
+        webhook_url TEXT,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        finished_at REAL,
+        expires_at REAL
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+    c.execute('''CREATE TABLE IF NOT EXISTS tickets (
+        row INTEGER PRIMARY KEY,
+        ticket TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )''')
     conn.commit()
     conn.close()
     print("Migration complete.")
@@ -0,0 +1,45 @@
+"""
+Import api/main.py for backend tests, with an isolated database and no Ollama.
+Tests that import this are skipped when the API dependencies aren't installed.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+API_DIR = os.path.join(os.path.dirname(__file__), '..', 'api')
+
+try:
+    import fastapi  # noqa: F401
+    import httpx  # noqa: F401  (needed by TestClient)
+    import numpy  # noqa: F401
+except ImportError as e:
+    raise unittest.SkipTest(f"API dependencies not installed: {e}")
+
+os.environ.setdefault("DB_URL", os.path.join(tempfile.mkdtemp(), "keys.db"))
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("OLLAMA_URL", "http://127.0.0.1:9/api/generate")
+
+# main.py resolves templates/ and static/ relative to the working directory
+sys.path.insert(0, API_DIR)
+_cwd = os.getcwd()
+os.chdir(API_DIR)
+try:
+    import main
+finally:
+    os.chdir(_cwd)
+
+
+def create_legacy_key() -> str:
+    """Insert a random (hashed) key the way /api/create does without SIGNED_KEYS."""
+    import secrets
+    from datetime import datetime, timedelta
+    key = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    conn = main.get_db()
+    conn.execute("INSERT INTO api_keys (key_hash, created_at, expires_at) VALUES (?, ?, ?)",
+                 (main.hash_key(key), now.isoformat(), (now + timedelta(days=1)).isoformat()))
+    conn.commit()
+    conn.close()
+    return key
@@ -0,0 +1,143 @@
+"""
+Tests for API key verification: signed keys, revocation and legacy hashed keys.
+"""
+
+import os
+import subprocess
+import sys
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from app_loader import main, create_legacy_key, API_DIR
+from fastapi.testclient import TestClient
+
+
+def forge_signed_key(key_id, expires_ts, secret):
+    """Build an `sk1.` key signed with an arbitrary secret."""
+    import base64, hashlib, hmac
+    body = f"sk1.{key_id}.{expires_ts}.nonce"
+    digest = hmac.new(secret.encode(), body.encode(), hashlib.sha256).digest()
+    return f"{body}.{base64.urlsafe_b64encode(digest).rstrip(b'=').decode()}"
+
+
+class TestSignedKeys(unittest.TestCase):
+    """Test self-verifying signed keys"""
+
+    def setUp(self):
+        self.original = main.SIGNED_KEYS
+        main.SIGNED_KEYS = True
+        self.client = TestClient(main.app)
+        self.admin = ("admin", main.ADMIN_PASS)
+
+    def tearDown(self):
+        main.SIGNED_KEYS = self.original
+
+    def create_key(self, **body):
+        r = self.client.post("/api/create", json=body, auth=self.admin)
+        self.assertEqual(r.status_code, 200)
+        return r.json()["api_key"]
+
+    def test_issued_key_is_valid(self):
+        """Test that a freshly issued signed key verifies"""
+        key = self.create_key()
+        self.assertTrue(key.startswith("sk1."))
+        self.assertTrue(main.verify_key(key))
+
+    def test_forged_key_for_unknown_id_rejected(self):
+        """Test that a correctly signed key for an id that was never issued is rejected"""
+        key = forge_signed_key(424242, int(time.time()) + 3600, main.SECRET_KEY)
+        self.assertFalse(main.verify_key(key))
+
+    def test_forged_signature_rejected(self):
+        """Test that a key signed with another secret is rejected"""
+        key_id = int(self.create_key().split(".")[1])
+        key = forge_signed_key(key_id, int(time.time()) + 3600, "dev-secret-key")
+        self.assertFalse(main.verify_key(key))
+
+    def test_tampered_key_rejected(self):
+        """Test that changing the embedded expiry invalidates the signature"""
+        parts = self.create_key().split(".")
+        parts[2] = str(int(parts[2]) + 86400)
+        self.assertFalse(main.verify_key(".".join(parts)))
+
+    def test_expired_key_rejected(self):
+        """Test that a signed key past its embedded expiry is rejected"""
+        yesterday = (datetime.utcnow() - timedelta(days=1)).date().isoformat()
+        self.assertFalse(main.verify_key(self.create_key(expires_at=yesterday)))
+
+    def test_revoked_key_rejected(self):
+        """Test that deleting a key revokes it in memory"""
+        key = self.create_key()
+        key_id = int(key.split(".")[1])
+        r = self.client.delete(f"/api/delete/{key_id}", auth=self.admin)
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(main.verify_key(key))
+
+    def test_verification_stays_off_the_database(self):
+        """Test that verifying a known signed key doesn't query the DB"""
+        key = self.create_key()
+        original = main.get_db
+        main.get_db = lambda: self.fail("verification should not touch the DB")
+        try:
+            self.assertTrue(main.verify_key(key))
+        finally:
+            main.get_db = original
+
+    def test_key_from_another_worker_is_accepted(self):
+        """Test that a signed key whose id is in the DB but not yet loaded verifies"""
+        key = self.create_key()
+        key_id = int(key.split(".")[1])
+        with main._revocations_lock:
+            main._issued_ids.discard(key_id)
+        self.assertTrue(main.verify_key(key))
+        self.assertIn(key_id, main._issued_ids)
+
+    def test_signed_path_disabled(self):
+        """Test that a validly signed sk1. key is not trusted while SIGNED_KEYS is off"""
+        main.SIGNED_KEYS = False
+        key = forge_signed_key(424242, 9999999999, main.SECRET_KEY)
+        self.assertFalse(main.verify_key(key))
+        r = self.client.post("/generate", json={"prompt": "x"}, headers={"x-api-key": key})
+        self.assertEqual(r.status_code, 401)
+
+    def test_issued_signed_key_survives_disabling(self):
+        """Test that issued signed keys fall back to the hashed lookup if SIGNED_KEYS is turned off"""
+        key = self.create_key()
+        main.SIGNED_KEYS = False
+        self.assertTrue(main.verify_key(key))
+
+
+class TestLegacyKeys(unittest.TestCase):
+    """Test random hashed keys, which must keep working during migration"""
+
+    def test_legacy_key_valid_in_both_modes(self):
+        """Test that legacy keys verify with SIGNED_KEYS on and off"""
+        key = create_legacy_key()
+        original = main.SIGNED_KEYS
+        try:
+            for mode in (False, True):
+                main.SIGNED_KEYS = mode
+                self.assertTrue(main.verify_key(key))
+        finally:
+            main.SIGNED_KEYS = original
+
+    def test_unknown_legacy_key_rejected(self):
+        """Test that a key with no matching hash is rejected"""
+        self.assertFalse(main.verify_key("not-a-real-key"))
+
+
+class TestSignedKeyConfig(unittest.TestCase):
+    """Test startup checks for signed keys"""
+
+    def test_refuses_default_secret(self):
+        """Test that the app won't start with signed keys and the default SECRET_KEY"""
+        env = dict(os.environ, SIGNED_KEYS="true", SECRET_KEY="dev-secret-key")
+        result = subprocess.run([sys.executable, "-c", "import main"], cwd=API_DIR, env=env,
+                                capture_output=True, text=True, timeout=60)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("SECRET_KEY", result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+"""
+Tests that upstream generations are aborted when their client disconnects or
+the gateway drains. Uses a slow fake Ollama that streams one chunk every 100ms.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from app_loader import main, create_legacy_key
+from fastapi.testclient import TestClient
+
+
+class SlowOllama(BaseHTTPRequestHandler):
+    """Streams 50 NDJSON chunks, 100ms apart, and records whether the client hung up."""
+    aborted = threading.Event()
+    completed = threading.Event()
+    requests = 0
+
+    def do_POST(self):
+        SlowOllama.requests += 1
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for i in range(50):
+                time.sleep(0.1)
+                self.wfile.write(json.dumps({"response": f"t{i} ", "done": False}).encode() + b"\n")
+                self.wfile.flush()
+            self.wfile.write(json.dumps({"response": "", "done": True}).encode() + b"\n")
+            SlowOllama.completed.set()
+        except (BrokenPipeError, ConnectionResetError):
+            SlowOllama.aborted.set()
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowOllamaTestCase(unittest.TestCase):
+    """Point the gateway at a fresh SlowOllama server"""
+
+    def setUp(self):
+        SlowOllama.aborted.clear()
+        SlowOllama.completed.clear()
+        SlowOllama.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SlowOllama)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.original_url = main.OLLAMA_URL
+        main.OLLAMA_URL = f"http://127.0.0.1:{self.server.server_address[1]}/api/generate"
+
+    def tearDown(self):
+        main.OLLAMA_URL = self.original_url
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestClientDisconnect(SlowOllamaTestCase):
+    """Test disconnect cancellation end to end through the ASGI app"""
+
+    def test_disconnect_aborts_upstream(self):
+        """Test that a client disconnect ends the request and the upstream stream"""
+        key = create_legacy_key()
+        body = json.dumps({"prompt": "long"}).encode()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": "/generate", "raw_path": b"/generate", "root_path": "",
+            "query_string": b"", "server": ("test", 80), "client": ("127.0.0.1", 1234),
+            "headers": [(b"content-type", b"application/json"), (b"x-api-key", key.encode()),
+                        (b"content-length", str(len(body)).encode())],
+        }
+        sent = []
+
+        async def run():
+            messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop(0)
+                await asyncio.sleep(0.5)  # Client gives up mid-generation
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                sent.append(message)
+
+            await asyncio.wait_for(main.app(scope, receive, send), timeout=4)
+
+        failures_before = main.METRICS["upstream_abort_failures"]
+        cancelled_before = main.METRICS["generations_cancelled"]
+        started = time.time()
+        asyncio.run(run())
+
+        self.assertLess(time.time() - started, 3, "request should end soon after the disconnect")
+        self.assertTrue(SlowOllama.aborted.wait(2), "upstream connection should be closed")
+        self.assertFalse(SlowOllama.completed.is_set())
+        self.assertEqual(sent[0]["status"], 499)
+        self.assertEqual(main.METRICS["generations_cancelled"], cancelled_before + 1)
+        self.assertEqual(main.METRICS["upstream_abort_failures"], failures_before)
+
+
+class TestDrainWaitsForRequests(unittest.TestCase):
+    """Test that a drain waits for whole requests, not just open upstream calls"""
+
+    def setUp(self):
+        self.originals = main.call_ollama, main.SUMMARY_CHUNK_CHARS, main.SUMMARY_CHUNK_OVERLAP
+        main.SUMMARY_CHUNK_CHARS, main.SUMMARY_CHUNK_OVERLAP = 40, 0
+        main.call_ollama = self.fake_call
+        self.calls = 0
+
+    def tearDown(self):
+        main.call_ollama, main.SUMMARY_CHUNK_CHARS, main.SUMMARY_CHUNK_OVERLAP = self.originals
+        main.DRAINING = False
+
+    def fake_call(self, prompt):
+        # Stands in for an upstream call without registering it, like the gaps between stages
+        self.calls += 1
+        time.sleep(0.3)
+        return {"response": "summary"}
+
+    def test_drain_waits_between_stages(self):
+        """Test that a drain started mid-request lets the request finish before reporting drained"""
+        key = create_legacy_key()
+        result = {}
+        def summarize():
+            r = TestClient(main.app).post("/summarize", json={"text": "word " * 40}, headers={"x-api-key": key})
+            result["events"] = [json.loads(line)["event"] for line in r.text.splitlines()]
+        thread = threading.Thread(target=summarize)
+        thread.start()
+        time.sleep(0.1)
+        started = time.time()
+        r = TestClient(main.app).post("/admin/drain?timeout=5", auth=("admin", main.ADMIN_PASS))
+        self.assertEqual(r.json()["cancelled"], 0)
+        self.assertGreater(time.time() - started, 0.6, "drain should wait for the map and reduce stages")
+        thread.join()
+        self.assertEqual(result["events"][-1], "done")
+        self.assertGreater(self.calls, 5)
+
+    def test_new_work_is_refused_while_draining(self):
+        """Test that calls outside any tracked request are refused once draining"""
+        main.call_ollama = self.originals[0]
+        main.DRAINING = True
+        with self.assertRaises(main.HTTPException) as ctx:
+            main.call_ollama("hi")
+        self.assertEqual(ctx.exception.status_code, 503)
+
+
+class TestJobDrain(SlowOllamaTestCase):
+    """Test that queued jobs stay parked while the gateway drains"""
+    workers_started = False
+
+    def setUp(self):
+        super().setUp()
+        if not TestJobDrain.workers_started:
+            main.start_job_workers()
+            TestJobDrain.workers_started = True
+        self.client = TestClient(main.app)
+        self.admin = ("admin", main.ADMIN_PASS)
+        self.headers = {"x-api-key": create_legacy_key()}
+
+    def tearDown(self):
+        conn = main.get_db()
+        conn.execute("DELETE FROM jobs")
+        conn.commit()
+        conn.close()
+        main.DRAINING = False
+        super().tearDown()
+
+    def wait_for(self, condition, timeout=3):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if condition():
+                return True
+            time.sleep(0.05)
+        return False
+
+    def job_status(self, job_id):
+        r = self.client.get(f"/jobs/{job_id}", headers=self.headers)
+        self.assertEqual(r.status_code, 200)
+        return r.json()["status"]
+
+    def test_drained_job_is_not_rerun_until_resumed(self):
+        """Test that a job cancelled by a drain is re-queued but not claimed again during the drain"""
+        job_id = self.client.post("/jobs", json={"prompt": "long"}, headers=self.headers).json()["job_id"]
+        self.assertTrue(self.wait_for(lambda: SlowOllama.requests == 1), "job should start")
+
+        r = self.client.post("/admin/drain?timeout=0.1", auth=self.admin)
+        self.assertEqual(r.json()["cancelled"], 1)
+        self.assertTrue(SlowOllama.aborted.wait(2))
+
+        # Polling stays open during the drain; new work does not
+        self.assertTrue(self.wait_for(lambda: self.job_status(job_id) == "queued"))
+        time.sleep(1)
+        self.assertEqual(SlowOllama.requests, 1, "job must not be re-run while draining")
+        self.assertEqual(self.job_status(job_id), "queued")
+        r = self.client.post("/jobs", json={"prompt": "x"}, headers=self.headers)
+        self.assertEqual(r.status_code, 503)
+
+        self.client.delete("/admin/drain", auth=self.admin)
+        self.assertTrue(self.wait_for(lambda: SlowOllama.requests == 2), "job should resume after the drain")
+
+
+if __name__ == '__main__':
+    unittest.main()
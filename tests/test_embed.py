@@ -0,0 +1,96 @@
+"""
+Tests for the /embed micro-batcher, with a fake embedding call in place of Ollama.
+"""
+
+import threading
+import unittest
+
+from app_loader import main, create_legacy_key
+from fastapi.testclient import TestClient
+
+
+class TestEmbedBatcher(unittest.TestCase):
+    """Test batch merging, splitting and the max_batch limit"""
+
+    def setUp(self):
+        self.batches = []
+        self.original = main.embed_texts
+        main.embed_texts = self.fake_embed
+
+    def tearDown(self):
+        main.embed_texts = self.original
+
+    def fake_embed(self, texts):
+        self.batches.append(len(texts))
+        return [[float(text)] for text in texts]
+
+    def submit_concurrently(self, batcher, requests):
+        futures = [None] * len(requests)
+        def submit(i):
+            futures[i] = batcher.submit(requests[i])
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(requests))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return [f.result(timeout=5) for f in futures]
+
+    def test_concurrent_requests_share_a_batch(self):
+        batcher = main.EmbedBatcher(window_ms=200, max_batch=64)
+        results = self.submit_concurrently(batcher, [["1"], ["2", "3"], ["4"]])
+        self.assertEqual(results, [[[1.0]], [[2.0], [3.0]], [[4.0]]])
+        self.assertEqual(self.batches, [4])
+
+    def test_merged_batches_never_exceed_max_batch(self):
+        batcher = main.EmbedBatcher(window_ms=200, max_batch=4)
+        requests = [[str(i), str(i)] for i in range(3)] + [["9"]]
+        results = self.submit_concurrently(batcher, requests)
+        self.assertEqual(results, [[[float(t)] for t in texts] for texts in requests])
+        self.assertTrue(all(size <= 4 for size in self.batches), self.batches)
+        self.assertEqual(sum(self.batches), 7)
+
+    def test_large_request_is_split(self):
+        batcher = main.EmbedBatcher(window_ms=10, max_batch=4)
+        texts = [str(i) for i in range(10)]
+        self.assertEqual(batcher.submit(texts).result(timeout=5), [[float(t)] for t in texts])
+        self.assertEqual(sorted(self.batches), [2, 4, 4])
+
+    def test_queue_delay_is_averaged_per_queue_item(self):
+        batcher = main.EmbedBatcher(window_ms=10, max_batch=2)
+        before = {name: main.METRICS[name] for name in ("embed_requests", "embed_queue_items")}
+        batcher.submit(["1", "2", "3", "4", "5"]).result(timeout=5)
+        self.assertEqual(main.METRICS["embed_requests"] - before["embed_requests"], 1)
+        self.assertEqual(main.METRICS["embed_queue_items"] - before["embed_queue_items"], 3)
+
+    def test_failed_part_fails_the_request(self):
+        def failing_embed(texts):
+            if "bad" in texts:
+                raise main.HTTPException(status_code=502, detail="Ollama embedding error")
+            return [[0.0] for _ in texts]
+        main.embed_texts = failing_embed
+        batcher = main.EmbedBatcher(window_ms=10, max_batch=2)
+        with self.assertRaises(main.HTTPException):
+            batcher.submit(["a", "b", "bad"]).result(timeout=5)
+
+
+class TestEmbedEndpoint(unittest.TestCase):
+    """Test request limits on /embed"""
+
+    def test_unreachable_ollama_is_bad_gateway(self):
+        original = main.OLLAMA_BASE_URL
+        main.OLLAMA_BASE_URL = "http://127.0.0.1:9"
+        try:
+            r = TestClient(main.app).post("/embed", json={"input": "x"}, headers={"x-api-key": create_legacy_key()})
+        finally:
+            main.OLLAMA_BASE_URL = original
+        self.assertEqual(r.status_code, 502)
+
+    def test_rejects_too_many_inputs(self):
+        client = TestClient(main.app)
+        body = {"input": ["x"] * (main.EMBED_MAX_INPUTS + 1)}
+        r = client.post("/embed", json=body, headers={"x-api-key": create_legacy_key()})
+        self.assertEqual(r.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Tests for Idempotency-Key handling on /generate.
+"""
+
+import threading
+import time
+import unittest
+import uuid
+
+from app_loader import main, create_legacy_key
+from fastapi.testclient import TestClient
+
+
+class TestIdempotency(unittest.TestCase):
+    """Test that retries with an Idempotency-Key share one generation"""
+
+    def setUp(self):
+        self.original = main.call_ollama
+        main.call_ollama = self.fake_call
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = False
+        self.client = TestClient(main.app)
+        self.api_key = create_legacy_key()
+
+    def tearDown(self):
+        self.release.set()
+        main.call_ollama = self.original
+
+    def fake_call(self, prompt):
+        self.calls.append(prompt)
+        self.release.wait(3)
+        if self.fail:
+            raise main.HTTPException(status_code=502, detail="Ollama error")
+        return {"response": f"answer {len(self.calls)}"}
+
+    def generate(self, key, prompt="hi", api_key=None):
+        headers = {"x-api-key": api_key or self.api_key, "Idempotency-Key": key}
+        return self.client.post("/generate", json={"prompt": prompt}, headers=headers)
+
+    def test_concurrent_retries_share_one_call(self):
+        key = str(uuid.uuid4())
+        self.release.clear()
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(self.generate(key))) for _ in range(3)]
+        for t in threads:
+            t.start()
+        time.sleep(0.3)
+        self.release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual([r.json() for r in responses], [{"response": "answer 1"}] * 3)
+
+    def test_finished_result_is_replayed(self):
+        key = str(uuid.uuid4())
+        first = self.generate(key).json()
+        replays_before = main.METRICS["idempotent_replays"]
+        self.assertEqual(self.generate(key).json(), first)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(main.METRICS["idempotent_replays"], replays_before + 1)
+
+    def test_key_reused_with_different_prompt(self):
+        key = str(uuid.uuid4())
+        self.generate(key, "hi")
+        self.assertEqual(self.generate(key, "something else").status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_failure_is_not_stored(self):
+        key = str(uuid.uuid4())
+        self.fail = True
+        self.assertEqual(self.generate(key).status_code, 502)
+        self.fail = False
+        r = self.generate(key)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_keys_are_scoped_per_api_key(self):
+        key = str(uuid.uuid4())
+        self.generate(key)
+        self.generate(key, api_key=create_legacy_key())
+        self.assertEqual(len(self.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Tests for the job queue: webhook validation and worker resilience.
+"""
+
+import sqlite3
+import threading
+import unittest
+
+from app_loader import main, create_legacy_key
+from fastapi.testclient import TestClient
+
+
+class TestWebhookValidation(unittest.TestCase):
+    """Test that job webhooks can't target the gateway's own network"""
+
+    def test_rejects_internal_addresses(self):
+        for url in ("http://127.0.0.1:11434/api/generate", "http://localhost:8000/admin/set-tunnel-url",
+                    "http://10.0.0.5/hook", "http://192.168.1.2/hook", "http://169.254.169.254/latest",
+                    "http://[::1]/hook", "http://0.0.0.0/hook"):
+            self.assertIsNotNone(main.webhook_url_error(url), url)
+
+    def test_accepts_public_address(self):
+        self.assertIsNone(main.webhook_url_error("https://93.184.215.14/hook"))
+
+    def test_rejects_other_schemes(self):
+        self.assertIsNotNone(main.webhook_url_error("file:///etc/passwd"))
+        self.assertIsNotNone(main.webhook_url_error("http:///no-host"))
+
+    def test_private_addresses_can_be_allowed(self):
+        original = main.JOB_WEBHOOK_ALLOW_PRIVATE
+        main.JOB_WEBHOOK_ALLOW_PRIVATE = True
+        try:
+            self.assertIsNone(main.webhook_url_error("http://127.0.0.1:9000/hook"))
+        finally:
+            main.JOB_WEBHOOK_ALLOW_PRIVATE = original
+
+    def test_submit_rejects_internal_webhook(self):
+        client = TestClient(main.app)
+        body = {"prompt": "hi", "webhook_url": "http://127.0.0.1:11434/api/generate"}
+        r = client.post("/jobs", json=body, headers={"x-api-key": create_legacy_key()})
+        self.assertEqual(r.status_code, 400)
+
+
+class TestJobWorker(unittest.TestCase):
+    """Test that a job worker survives database errors"""
+
+    def test_worker_continues_after_database_error(self):
+        original = main._run_next_job
+        recovered, park = threading.Event(), threading.Event()
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError("database is locked")
+            recovered.set()
+            park.wait()  # Keep this extra worker out of the other tests
+
+        main._run_next_job = flaky
+        errors_before = main.METRICS["job_worker_errors"]
+        try:
+            threading.Thread(target=main._job_worker, daemon=True).start()
+            self.assertTrue(recovered.wait(3), "worker should retry after the error")
+        finally:
+            main._run_next_job = original
+        self.assertEqual(main.METRICS["job_worker_errors"], errors_before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests for model keep-alive tuning and business-hours handling.
+"""
+
+import time
+import unittest
+from datetime import datetime
+
+from app_loader import main
+
+
+class TestBusinessHours(unittest.TestCase):
+    """Test parsing and use of BUSINESS_HOURS"""
+
+    def test_parse(self):
+        self.assertEqual(main._parse_business_hours("8-18"), (8, 18))
+        self.assertEqual(main._parse_business_hours("0-24"), (0, 24))
+        self.assertIsNone(main._parse_business_hours(""))
+
+    def test_parse_rejects_bad_values(self):
+        for value in ("08:00-18:00", "18-8", "8-25", "8", "a-b"):
+            with self.assertRaises(RuntimeError, msg=value):
+                main._parse_business_hours(value)
+
+    def test_closing_at_midnight(self):
+        original = main._business_hours
+        main._business_hours = (0, 24)
+        try:
+            closing = main._business_hours_end(datetime(2026, 3, 31, 15, 30))
+        finally:
+            main._business_hours = original
+        self.assertEqual(closing, datetime(2026, 4, 1, 0, 0))
+
+
+class TestTunedKeepAlive(unittest.TestCase):
+    """Test that only busy models stay loaded until closing time"""
+
+    def setUp(self):
+        self.original = main._business_hours
+        main._business_hours = (0, 24)
+
+    def tearDown(self):
+        main._business_hours = self.original
+
+    def state_with_arrivals(self, count):
+        state = main.ModelState()
+        now = time.time()
+        state.arrivals.extend(now - 60 * i for i in reversed(range(count)))
+        return state
+
+    def test_single_request_is_not_extended_to_closing(self):
+        self.assertEqual(main.tuned_keep_alive(self.state_with_arrivals(1)), main.KEEP_ALIVE_MIN)
+
+    def test_busy_model_stays_until_closing(self):
+        state = self.state_with_arrivals(int(main.BUSINESS_HOURS_MIN_RATE))
+        closing = main._business_hours_end(datetime.now())
+        until_closing = int((closing - datetime.now()).total_seconds())
+        self.assertGreaterEqual(main.tuned_keep_alive(state), until_closing - 1)
+
+
+class TestReapplyKeepAlive(unittest.TestCase):
+    """Test that keep_alive is re-sent only when Ollama will unload early"""
+
+    def setUp(self):
+        self.original = main.preload_model
+        self.preloads = []
+        main.preload_model = lambda model, keep_alive: self.preloads.append((model, keep_alive))
+
+    def tearDown(self):
+        main.preload_model = self.original
+        with main._model_lock:
+            main._model_states.pop("test-model", None)
+
+    def set_state(self, expires_in, wanted_in):
+        now = time.time()
+        with main._model_lock:
+            state = main._model_state("test-model")
+            state.expires_at, state.wanted_until = now + expires_in, now + wanted_in
+
+    def test_reapplies_when_ollama_reset_residency(self):
+        self.set_state(expires_in=300, wanted_in=3000)
+        main.reapply_keep_alive()
+        self.assertEqual(len(self.preloads), 1)
+        model, keep_alive = self.preloads[0]
+        self.assertEqual(model, "test-model")
+        self.assertAlmostEqual(keep_alive, 3000, delta=2)
+
+    def test_no_request_when_residency_matches(self):
+        self.set_state(expires_in=300, wanted_in=300)
+        main.reapply_keep_alive()
+        self.assertEqual(self.preloads, [])
+
+    def test_unloaded_model_is_not_reloaded(self):
+        self.set_state(expires_in=-10, wanted_in=3000)
+        main.reapply_keep_alive()
+        self.assertEqual(self.preloads, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
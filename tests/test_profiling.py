@@ -0,0 +1,78 @@
+"""
+Tests for on-demand and sampled request profiling.
+"""
+
+import io
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+from app_loader import main, create_legacy_key
+from fastapi.testclient import TestClient
+
+
+class TestProfiling(unittest.TestCase):
+    """Test profile capture, download and retention"""
+
+    def setUp(self):
+        self.originals = (main.call_ollama, main.PROFILE_DIR, main.PROFILE_MAX_FILES,
+                          main.PROFILE_SAMPLE_RATE, main.PROFILE_FLUSH_INTERVAL)
+        main.call_ollama = lambda prompt: (time.sleep(0.05), {"response": "ok"})[1]
+        main.PROFILE_DIR = tempfile.mkdtemp()
+        self.client = TestClient(main.app)
+        self.admin = ("admin", main.ADMIN_PASS)
+        self.key = create_legacy_key()
+
+    def tearDown(self):
+        (main.call_ollama, main.PROFILE_DIR, main.PROFILE_MAX_FILES,
+         main.PROFILE_SAMPLE_RATE, main.PROFILE_FLUSH_INTERVAL) = self.originals
+
+    def generate(self, profile=True):
+        headers = {"x-api-key": self.key}
+        if profile:
+            headers["x-profile"] = "1"
+        return self.client.post("/generate", json={"prompt": "hi"}, headers=headers, auth=self.admin)
+
+    def test_profiled_request_is_downloadable(self):
+        r = self.generate()
+        self.assertEqual(r.status_code, 200)
+        name = r.headers["x-profile-id"]
+        listed = self.client.get("/admin/profiles", auth=self.admin).json()["profiles"]
+        self.assertIn(name, [p["name"] for p in listed])
+        download = self.client.get(f"/admin/profiles/{name}", auth=self.admin)
+        self.assertEqual(download.status_code, 200)
+        path = os.path.join(main.PROFILE_DIR, "download.prof")
+        with open(path, "wb") as f:
+            f.write(download.content)
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).print_stats()
+        # The whole request path is covered, including response serialization
+        self.assertIn("serialize_response", out.getvalue())
+
+    def test_unflagged_request_is_not_profiled(self):
+        main.PROFILE_SAMPLE_RATE = 0
+        self.assertNotIn("x-profile-id", self.generate(profile=False).headers)
+        self.assertEqual(os.listdir(main.PROFILE_DIR), [])
+
+    def test_old_profiles_are_pruned(self):
+        main.PROFILE_MAX_FILES = 2
+        names = [self.generate().headers["x-profile-id"] for _ in range(4)]
+        self.assertEqual(sorted(os.listdir(main.PROFILE_DIR)), sorted(names[-2:]))
+
+    def test_sampling_writes_folded_stacks(self):
+        main.PROFILE_SAMPLE_RATE, main.PROFILE_FLUSH_INTERVAL = 1, 0
+        path = os.path.join(main.PROFILE_DIR, "sampled.folded")
+        deadline = time.time() + 5
+        while not os.path.exists(path) and time.time() < deadline:
+            self.generate(profile=False)
+            time.sleep(0.05)
+        main.PROFILE_SAMPLE_RATE = 0
+        self.assertTrue(os.path.exists(path), "sampler should flush sampled.folded")
+        with open(path) as f:
+            self.assertRegex(f.readline(), r"^.+ \d+$")
+
+
+if __name__ == '__main__':
+    unittest.main()
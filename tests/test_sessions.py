@@ -0,0 +1,116 @@
+"""
+Tests for conversation sessions against a fake native Ollama.
+"""
+
+import json
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from app_loader import main, create_legacy_key
+from fastapi.testclient import TestClient
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """Native /api/generate that returns the received context plus one token."""
+    requests = []
+    release = threading.Event()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeOllama.requests.append((self.path, body))
+        if body["prompt"] == "slow":
+            FakeOllama.release.wait(3)
+        context = (body.get("context") or []) + [len(FakeOllama.requests)]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        self.wfile.write(json.dumps({"response": "ok", "done": True, "context": context}).encode() + b"\n")
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSessions(unittest.TestCase):
+    """Test session turns, scoping and eviction"""
+
+    def setUp(self):
+        FakeOllama.requests = []
+        FakeOllama.release.clear()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.originals = main.OLLAMA_URL, main.OLLAMA_BASE_URL
+        # Default deployment mode: sessions must still go to the native API
+        main.OLLAMA_BASE_URL = f"http://127.0.0.1:{self.server.server_address[1]}"
+        main.OLLAMA_URL = main.OLLAMA_BASE_URL + "/v1/responses"
+        self.client = TestClient(main.app)
+        self.headers = {"x-api-key": create_legacy_key()}
+
+    def tearDown(self):
+        FakeOllama.release.set()
+        main.OLLAMA_URL, main.OLLAMA_BASE_URL = self.originals
+        self.server.shutdown()
+        self.server.server_close()
+
+    def start(self, headers=None):
+        r = self.client.post("/sessions", headers=headers or self.headers)
+        self.assertEqual(r.status_code, 200)
+        return r.json()["session_id"]
+
+    def turn(self, session_id, prompt="hi", headers=None):
+        return self.client.post(f"/sessions/{session_id}/generate", json={"prompt": prompt}, headers=headers or self.headers)
+
+    def test_context_round_trips_through_native_api(self):
+        session_id = self.start()
+        first, second = self.turn(session_id), self.turn(session_id)
+        self.assertEqual([first.json()["turn"], second.json()["turn"]], [1, 2])
+        self.assertNotIn("context", second.json())
+        (path1, body1), (path2, body2) = FakeOllama.requests
+        self.assertEqual([path1, path2], ["/api/generate", "/api/generate"])
+        self.assertNotIn("context", body1)
+        self.assertEqual(body2["context"], [1])
+        self.assertEqual(body2["prompt"], "hi")
+
+    def test_sessions_are_scoped_per_key(self):
+        session_id = self.start()
+        other = {"x-api-key": create_legacy_key()}
+        self.assertEqual(self.turn(session_id, headers=other).status_code, 404)
+        self.assertEqual(self.client.delete(f"/sessions/{session_id}", headers=other).status_code, 404)
+        self.assertEqual(self.turn(session_id).status_code, 200)
+
+    def test_least_recently_used_session_is_evicted(self):
+        original = main.SESSION_MAX
+        main.SESSION_MAX = 2
+        try:
+            oldest, recent = self.start(), self.start()
+            self.turn(oldest)  # Now the most recently used
+            self.start()
+        finally:
+            main.SESSION_MAX = original
+        self.assertEqual(self.turn(oldest).status_code, 200)
+        self.assertEqual(self.turn(recent).status_code, 404)
+
+    def test_concurrent_turn_is_rejected(self):
+        session_id = self.start()
+        results = {}
+        thread = threading.Thread(target=lambda: results.setdefault("slow", self.turn(session_id, "slow")))
+        thread.start()
+        while not FakeOllama.requests:
+            pass
+        self.assertEqual(self.turn(session_id).status_code, 409)
+        FakeOllama.release.set()
+        thread.join()
+        self.assertEqual(results["slow"].status_code, 200)
+        self.assertEqual(self.turn(session_id).json()["turn"], 2)
+
+    def test_failed_turn_releases_session(self):
+        session_id = self.start()
+        self.server.shutdown()
+        self.server.server_close()
+        self.client = TestClient(main.app, raise_server_exceptions=False)
+        self.assertEqual(self.turn(session_id).status_code, 500)
+        self.assertFalse(main._sessions[(main.hash_key(self.headers["x-api-key"]), session_id)]["busy"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Tests for the map-reduce summarizer: chunking, grouping and the reduce stages.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from app_loader import main, API_DIR
+
+
+class TestSplitText(unittest.TestCase):
+    """Test chunking of long documents"""
+
+    def test_chunks_are_bounded_and_cover_the_text(self):
+        words = [f"w{i}" for i in range(500)]
+        chunks = main.split_text(" ".join(words), 100, 20)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        seen = set(word for chunk in chunks for word in chunk.split())
+        self.assertEqual(seen, set(words))
+
+    def test_neighbouring_chunks_overlap(self):
+        chunks = main.split_text(" ".join(f"w{i}" for i in range(500)), 100, 20)
+        for left, right in zip(chunks, chunks[1:]):
+            self.assertIn(right.split()[0], left.split())
+
+    def test_short_and_empty_text(self):
+        self.assertEqual(main.split_text("hello world", 100, 20), ["hello world"])
+        self.assertEqual(main.split_text("   ", 100, 20), [])
+
+    def test_text_without_spaces_still_advances(self):
+        chunks = main.split_text("x" * 1000, 100, 20)
+        self.assertLess(len(chunks), 15)
+
+
+class TestGroupSummaries(unittest.TestCase):
+    """Test packing of summaries for the reduce stage"""
+
+    def test_groups_hold_at_least_two(self):
+        groups = main.group_summaries(["a" * 60] * 5, 100)
+        self.assertEqual([len(group) for group in groups], [2, 2, 1])
+
+    def test_small_summaries_share_a_group(self):
+        self.assertEqual(main.group_summaries(["a", "b", "c"], 100), [["a", "b", "c"]])
+
+
+class TestSummarizeStream(unittest.TestCase):
+    """Test the map and reduce stages with a fake Ollama"""
+
+    def setUp(self):
+        self.original = main.call_ollama
+        main.call_ollama = self.fake_call
+        self.prompts = []
+
+    def tearDown(self):
+        main.call_ollama = self.original
+
+    def fake_call(self, prompt):
+        self.prompts.append(prompt)
+        return {"response": "s" * 60}
+
+    def test_single_trailing_group_is_carried_over(self):
+        original = main.SUMMARY_CHUNK_CHARS, main.SUMMARY_CHUNK_OVERLAP
+        main.SUMMARY_CHUNK_CHARS, main.SUMMARY_CHUNK_OVERLAP = 100, 0
+        try:
+            events = [json.loads(line) for line in main.summarize_stream(" ".join(["word"] * 95))]
+        finally:
+            main.SUMMARY_CHUNK_CHARS, main.SUMMARY_CHUNK_OVERLAP = original
+        self.assertEqual(events[0], {"event": "start", "chunks": 5})
+        self.assertEqual(events[-1]["event"], "done")
+        # 5 summaries -> groups of 2, 2, 1 -> 3 -> groups of 2, 1 -> 2 -> 1: only merged groups are sent
+        reduce_calls = [p for p in self.prompts if p.startswith(main.SUMMARY_REDUCE_PROMPT[:20])]
+        self.assertEqual(len(reduce_calls), 4)
+        self.assertTrue(all(p.count("s" * 60) >= 2 for p in reduce_calls))
+
+
+class TestSummaryConfig(unittest.TestCase):
+    """Test startup checks for the chunking settings"""
+
+    def test_refuses_overlap_of_half_a_chunk(self):
+        env = dict(os.environ, SUMMARY_CHUNK_CHARS="1000", SUMMARY_CHUNK_OVERLAP="500")
+        result = subprocess.run([sys.executable, "-c", "import main"], cwd=API_DIR, env=env,
+                                capture_output=True, text=True, timeout=60)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("SUMMARY_CHUNK_OVERLAP", result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Tests for the ticket retrieval index and its endpoints.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from app_loader import main, create_legacy_key
+from fastapi.testclient import TestClient
+
+
+class TestTicketIndex(unittest.TestCase):
+    """Test the memory-mapped ticket index"""
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "tickets.f32")
+
+    def test_search_returns_best_match_first(self):
+        index = main.TicketIndex(self.path)
+        index.append([[1, 0, 0], [0, 1, 0], [0.9, 0.1, 0]])
+        hits = index.search([1, 0, 0], 2)
+        self.assertEqual([row for row, _ in hits], [0, 2])
+
+    def test_search_rejects_wrong_dimension(self):
+        index = main.TicketIndex(self.path)
+        index.append([[1, 0, 0]])
+        with self.assertRaises(main.HTTPException) as ctx:
+            index.search([1, 0, 0, 0], 1)
+        self.assertEqual(ctx.exception.status_code, 409)
+
+    def test_index_from_another_model_is_rejected(self):
+        main.TicketIndex(self.path).append([[1, 0, 0]])
+        with open(self.path + ".json", "w") as f:
+            json.dump({"dim": 3, "model": "some-other-model"}, f)
+        index = main.TicketIndex(self.path)
+        for call in (lambda: index.search([1, 0, 0], 1), lambda: index.append([[0, 1, 0]])):
+            with self.assertRaises(main.HTTPException) as ctx:
+                call()
+            self.assertEqual(ctx.exception.status_code, 409)
+
+
+class TestTicketEndpoints(unittest.TestCase):
+    """Test access control and limits on the ticket endpoints"""
+
+    def setUp(self):
+        self.client = TestClient(main.app)
+        self.key = create_legacy_key()
+        self.originals = main.ticket_index, main.call_ollama, main.embed_texts
+        main.ticket_index = main.TicketIndex(os.path.join(tempfile.mkdtemp(), "tickets.f32"))
+        main.call_ollama = lambda prompt: {"response": "restart it"}
+        main.embed_texts = self.unreachable_embed
+
+    def tearDown(self):
+        main.ticket_index, main.call_ollama, main.embed_texts = self.originals
+
+    def unreachable_embed(self, texts):
+        raise AssertionError("embedding model should not be called")
+
+    def resolve(self, **body):
+        return self.client.post("/ticket/resolve", json={"ticket": "t", **body}, headers={"x-api-key": self.key})
+
+    def test_resolve_skips_embedding_when_nothing_to_search(self):
+        for body in ({}, {"top_k": 0}):
+            r = self.resolve(**body)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json()["similar"], [])
+
+    def test_resolve_without_examples_after_model_change(self):
+        main.ticket_index.append([[1, 0, 0]])
+        main.ticket_index.model = "some-other-model"
+        r = self.resolve()
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json(), {"resolution": "restart it", "similar": []})
+
+    def test_ingest_requires_admin(self):
+        body = {"tickets": [{"ticket": "t", "resolution": "r"}]}
+        r = self.client.post("/ticket/ingest", json=body, headers={"x-api-key": self.key})
+        self.assertEqual(r.status_code, 401)
+
+    def test_resolve_bounds_top_k(self):
+        self.assertEqual(self.resolve(top_k=100000).status_code, 400)
+
+
+class TestEmbedTexts(unittest.TestCase):
+    """Test errors from Ollama's embedding endpoint"""
+
+    def test_unreachable_ollama_is_bad_gateway(self):
+        original = main.OLLAMA_BASE_URL
+        main.OLLAMA_BASE_URL = "http://127.0.0.1:9"
+        try:
+            with self.assertRaises(main.HTTPException) as ctx:
+                main.embed_texts(["t"])
+            self.assertEqual(ctx.exception.status_code, 502)
+        finally:
+            main.OLLAMA_BASE_URL = original
+
+
+if __name__ == '__main__':
+    unittest.main()